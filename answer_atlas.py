@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""答案图谱：预先枚举题型1-6的全部配置，写成紧凑的二进制文件，求解时内存映射后直接按下标读取
+
+只有一组样例且输入各形状互不相同时，输入到输出的相对排列r是唯一的，
+答案只取决于 (题型, 固定变换, r)。4个形状时三次变换题型共 3 × 24² × 24 种配置。
+文件布局(排列均以引擎编号存为1字节，NONE表示无解):
+    头部   magic, 版本, n, 排列数P
+    AUTO1   [r]                  自动Q1的3个选项
+    AUTO23  [题型][r]            自动Q2/Q3的固定变换 + 3个选项
+    AUTO456 [题型][r]            自动Q4-Q6的两个固定变换 + 3个选项
+    SEMI1   [r]                  Q1的正确变换
+    SEMI23  [题型][固定][r]      Q2/Q3的正确可选变换
+    SEMI456 [题型][固定1][固定2][r]  Q4-Q6的正确可选变换
+多个进程映射同一文件时共享同一份物理页。
+"""
+
+import mmap
+import os
+import random
+import struct
+import sys
+from typing import List, Optional, Sequence, Tuple
+
+from perm_engine import Stage
+
+ATLAS_MAGIC = b'PATL'
+# 版本2: 推导出的干扰项不再包含恒等变换
+ATLAS_VERSION = 2
+# 三次变换题型的配置数随 n!³ 增长，只为不超过4个形状的情形生成
+ATLAS_MAX_N = 4
+# 默认的图谱文件，与本模块放在同一目录
+ATLAS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pipe_atlas.bin')
+
+NONE = 0xFF
+_HEADER = struct.Struct('<4sBBH')
+
+
+def _layout(p: int) -> List[Tuple[str, int]]:
+    """各区段的名称与字节数，顺序即文件中的顺序"""
+    return [
+        ('auto1', p * 3),
+        ('auto23', 2 * p * 4),
+        ('auto456', 3 * p * 5),
+        ('semi1', p),
+        ('semi23', 2 * p * p),
+        ('semi456', 3 * p * p * p),
+    ]
+
+
+def _offsets(p: int) -> Tuple[dict, int]:
+    """各区段的起始偏移和文件总长"""
+    offsets = {}
+    position = _HEADER.size
+    for name, size in _layout(p):
+        offsets[name] = position
+        position += size
+    return offsets, position
+
+
+class AnswerAtlas:
+    """只读的答案图谱，按下标读取内存映射的文件"""
+
+    def __init__(self, path: str, engine):
+        self.engine = engine
+        self.path = path
+        with open(path, 'rb') as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        p = len(engine.perms)
+        if len(self._data) < _HEADER.size:
+            self._data.close()
+            raise ValueError("文件不完整")
+        magic, version, n, count = _HEADER.unpack_from(self._data, 0)
+        self._offsets, size = _offsets(p)
+        if magic != ATLAS_MAGIC or version != ATLAS_VERSION or n != engine.n or count != p \
+                or len(self._data) != size:
+            self._data.close()
+            raise ValueError("文件与当前版本不符")
+        self._p = p
+
+    def close(self) -> None:
+        self._data.close()
+
+    def _read(self, section: str, index: int, width: int = 1) -> List[Optional[int]]:
+        start = self._offsets[section] + index * width
+        return [None if byte == NONE else byte for byte in self._data[start:start + width]]
+
+    def relative_id(self, input_seqs: List[List[str]], output_seqs: List[List[str]]) -> Optional[int]:
+        """只有一组样例、输入形状互不相同且输出是其重排时，返回相对排列编号"""
+        if len(input_seqs) != 1 or len(output_seqs) != 1:
+            return None
+        input_seq, output_seq = input_seqs[0], output_seqs[0]
+        n = self.engine.n
+        if len(input_seq) != n or len(set(input_seq)) != n or sorted(input_seq) != sorted(output_seq):
+            return None
+        positions = {symbol: i for i, symbol in enumerate(input_seq)}
+        return self.engine.perm_id(''.join(str(positions[symbol] + 1) for symbol in output_seq))
+
+    def _perm_ids(self, perms: Sequence) -> Optional[List[int]]:
+        ids = [self.engine.perm_id(perm) if isinstance(perm, str) else None for perm in perms]
+        return None if None in ids else ids
+
+    def _strings(self, ids: Sequence[Optional[int]]) -> Optional[List[str]]:
+        if None in ids:
+            return None
+        return [self.engine.perm_strings[perm_id] for perm_id in ids]
+
+    def derive(self, question_type: str, r: int, fixed) -> Tuple[object, Optional[List[str]]]:
+        """未给出选项时按自动/半自动模式推导 (固定变换, 选项)"""
+        p = self._p
+        if question_type == '1':
+            return fixed, self._strings(self._read('auto1', r, 3))
+        if fixed is None:
+            if question_type in ['2', '3']:
+                ids = self._read('auto23', (int(question_type) - 2) * p + r, 4)
+                if None in ids:
+                    return None, None
+                return self.engine.perm_strings[ids[0]], self._strings(ids[1:])
+            ids = self._read('auto456', (int(question_type) - 4) * p + r, 5)
+            if None in ids:
+                return None, None
+            return self._strings(ids[:2]), self._strings(ids[2:])
+        variable = self.variable(question_type, r, fixed)
+        if variable is None:
+            return fixed, None
+        return fixed, build_options(self.engine, variable)
+
+    def variable(self, question_type: str, r: int, fixed) -> Optional[int]:
+        """给定固定变换时正确的可选变换编号"""
+        p = self._p
+        if question_type == '1':
+            return self._read('semi1', r)[0]
+        if question_type in ['2', '3']:
+            (fixed_id,) = self._perm_ids([fixed])
+            return self._read('semi23', ((int(question_type) - 2) * p + fixed_id) * p + r)[0]
+        fixed1, fixed2 = self._perm_ids(fixed)
+        return self._read('semi456', (((int(question_type) - 4) * p + fixed1) * p + fixed2) * p + r)[0]
+
+    def solve(self, question_type: str, input_seqs: List[List[str]], output_seqs: List[List[str]],
+              fixed, options: Optional[List[str]]) -> Optional[dict]:
+        """按图谱求解题型1-6，结果与 VisualReasoningSolver.solve_puzzle 相同；不适用时返回None"""
+        r = self.relative_id(input_seqs, output_seqs)
+        if r is None:
+            return None
+        if question_type != '1' and fixed is None and options is not None:
+            # 图谱只存自动推导出的固定变换及选项，与给出的选项无从对应
+            return None
+        if question_type in ['2', '3'] and fixed is not None and self._perm_ids([fixed]) is None:
+            return None
+        if question_type in ['4', '5', '6'] and fixed is not None and self._perm_ids(fixed) is None:
+            return None
+        if options is not None and self._perm_ids(options) is None:
+            return None
+
+        result = {'type': question_type}
+        if options is None:
+            fixed, options = self.derive(question_type, r, fixed)
+        if fixed is not None:
+            result['fixed'] = fixed
+        if options is not None:
+            result['options'] = options
+        variable = self.variable(question_type, r, fixed) if options else None
+        perm = None if variable is None else self.engine.perm_strings[variable]
+        candidates = [i + 1 for i, option in enumerate(options or []) if option == perm]
+        if not candidates:
+            result['status'] = 'no_solution'
+            return result
+
+        result['status'] = 'ok'
+        result['answer'] = candidates[0]
+        result['choice'] = perm
+        result['candidates'] = candidates
+        result['ambiguous'] = len(candidates) > 1
+        return result
+
+
+def build_options(engine, correct_id: int) -> List[str]:
+    """与 VisualReasoningSolver._build_options 相同的选项生成规则
+
+    图谱只覆盖输入形状互不相同的题目，此时每个排列自成一个输出等价类，
+    干扰项即按编号顺序跳过正确答案和恒等变换。
+    """
+    options = [correct_id]
+    for perm_id in range(len(engine.perms)):
+        if perm_id != engine.identity and perm_id != correct_id:
+            options.append(perm_id)
+            if len(options) >= 3:
+                break
+    return [engine.perm_strings[perm_id] for perm_id in options]
+
+
+def load_atlas(engine, path: str = ATLAS_PATH) -> Optional[AnswerAtlas]:
+    """映射图谱文件；文件不存在、形状数不同、版本过旧或文件损坏时返回None"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(_HEADER.size)
+        if len(header) == _HEADER.size:
+            magic, version, n, _ = _HEADER.unpack(header)
+            if n != engine.n:
+                return None
+            if magic == ATLAS_MAGIC and version != ATLAS_VERSION:
+                # 旧版本的图谱照常求解，不影响结果
+                print(f"答案图谱版本过旧，已忽略，可用 --build-atlas 重新生成: {path}", file=sys.stderr)
+                return None
+        return AnswerAtlas(path, engine)
+    except (OSError, ValueError, struct.error) as e:
+        # 图谱只用于加速，损坏时照常求解
+        print(f"答案图谱无法读取，已忽略，可用 --build-atlas 重新生成: {path} ({e})", file=sys.stderr)
+        return None
+
+
+def build_atlas(solver, path: str = ATLAS_PATH) -> int:
+    """以求解器为基准枚举全部配置并写入图谱文件，返回文件字节数
+
+    solver应关闭缓存和图谱(cache_size=0, atlas_path=None)，保证每个配置都真实求解。
+    """
+    engine = solver.engine
+    if engine.n > ATLAS_MAX_N:
+        raise ValueError(f"答案图谱只支持不超过{ATLAS_MAX_N}个形状")
+    p = len(engine.perms)
+    perms = engine.perm_strings
+    ids = engine.index
+    input_seq = [str(i + 1) for i in range(engine.n)]
+    examples = [([input_seq], [solver.apply_permutation(input_seq, perm)]) for perm in perms]
+
+    def encode(values) -> bytes:
+        return bytes(NONE if value is None else ids[value] for value in values)
+
+    def variable(input_seqs, output_seqs, stages, position) -> Optional[str]:
+        solutions = solver.solve_stages(input_seqs, output_seqs, stages, limit=1)
+        return solutions[0].perms[position] if solutions else None
+
+    sections = {name: bytearray() for name, _ in _layout(p)}
+    for input_seqs, output_seqs in examples:
+        options = solver.auto_solve_q1(input_seqs, output_seqs)
+        sections['auto1'] += encode(options or [None] * 3)
+        sections['semi1'] += encode([variable(input_seqs, output_seqs, [Stage.free()], 0)])
+    for question_type in ['2', '3']:
+        for input_seqs, output_seqs in examples:
+            derived = solver.auto_solve_q2_q3(input_seqs, output_seqs, question_type)
+            sections['auto23'] += encode([derived[0]] + derived[1] if derived else [None] * 4)
+    for question_type in ['4', '5', '6']:
+        for input_seqs, output_seqs in examples:
+            derived = solver.auto_solve_q4_q6(input_seqs, output_seqs, question_type)
+            sections['auto456'] += encode([derived[0], derived[1]] + derived[2] if derived else [None] * 5)
+    for question_type in ['2', '3']:
+        for fixed in perms:
+            stages, position = solver.question_layout(question_type, (fixed,), Stage.free())
+            sections['semi23'] += encode([variable(input_seqs, output_seqs, stages, position)
+                                          for input_seqs, output_seqs in examples])
+    for question_type in ['4', '5', '6']:
+        for fixed1 in perms:
+            for fixed2 in perms:
+                stages, position = solver.question_layout(question_type, (fixed1, fixed2), Stage.free())
+                sections['semi456'] += encode([variable(input_seqs, output_seqs, stages, position)
+                                               for input_seqs, output_seqs in examples])
+
+    data = _HEADER.pack(ATLAS_MAGIC, ATLAS_VERSION, engine.n, p) + b''.join(
+        bytes(sections[name]) for name, _ in _layout(p))
+    # 先写临时文件再替换，正在映射旧文件的进程不受影响
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+    return len(data)
+
+
+def verify_atlas(solver, atlas: AnswerAtlas, samples: int = 2000, seed: int = 0) -> int:
+    """随机抽取图谱覆盖的题目，对照图谱与常规求解的结果，返回抽查的题数
+
+    solver应关闭缓存和图谱；题型2-6只给选项不给固定变换时，图谱应当放弃(返回None)。
+    结果不一致时抛出RuntimeError。
+    """
+    rng = random.Random(seed)
+    perms = solver.all_permutations
+    digits = ''.join(solver.shapes)
+    for _ in range(samples):
+        question_type = rng.choice('123456')
+        puzzle = {'type': question_type,
+                  'input': ''.join(rng.sample(digits, len(digits))),
+                  'output': ''.join(rng.sample(digits, len(digits)))}
+        if question_type in ['2', '3'] and rng.random() < 0.5:
+            puzzle['fixed'] = rng.choice(perms)
+        if question_type in ['4', '5', '6'] and rng.random() < 0.5:
+            puzzle['fixed'] = [rng.choice(perms), rng.choice(perms)]
+        if rng.random() < 0.5:
+            puzzle['options'] = [rng.choice(perms) for _ in range(3)]
+        input_seqs = solver.parse_sequence(puzzle['input'])
+        output_seqs = solver.parse_sequence(puzzle['output'])
+        answer = atlas.solve(question_type, input_seqs, output_seqs, puzzle.get('fixed'), puzzle.get('options'))
+        if question_type != '1' and 'fixed' not in puzzle and 'options' in puzzle:
+            expected = None
+        else:
+            expected = solver.solve_puzzle(puzzle)
+        if answer != expected:
+            raise RuntimeError(f"答案图谱与常规求解不一致: {puzzle} 图谱 {answer} 常规 {expected}")
+    return samples
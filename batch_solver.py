@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""批量求解：从JSON Lines逐行读取题目，逐行输出答案，全程无交互
+
+每行一道题，例如:
+    {"id": 1, "type": "5", "input": "1234", "output": "3412", "fixed": ["2143", "1342"]}
+    {"id": 2, "type": "7", "input": "1234", "output": "3412",
+     "first_options": "2413 2431 2134", "second_options": "3412 3421 3124"}
+    {"id": 3, "type": "pipeline", "input": "12345", "output": "34521", "stages": ["21345", null, null]}
+每道题输出一行结果，status为 ok / no_solution / error。
+"""
+
+import itertools
+import json
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import IO, Iterable, Iterator, List, Optional, Tuple
+
+from pipe_solver import VisualReasoningSolver
+
+# 多进程模式下每个工作进程持有的求解器(进程启动时构建一次)
+_worker_solver: Optional[VisualReasoningSolver] = None
+
+
+def solve_line(solver: VisualReasoningSolver, line: str, line_no: int) -> dict:
+    """求解一行题目，出错时返回error记录而不是抛出异常，一行出错不影响其余各行"""
+    try:
+        puzzle = json.loads(line)
+    except Exception as e:
+        return error_record(None, line_no, e)
+    return solve_record(solver, puzzle, line_no)
+
+
+def solve_record(solver: VisualReasoningSolver, puzzle, line_no: int) -> dict:
+    """求解已解析的一道题，出错时返回error记录"""
+    try:
+        if not isinstance(puzzle, dict):
+            raise ValueError("每行必须是一个JSON对象")
+        return solver.solve_puzzle(puzzle)
+    except Exception as e:
+        return error_record(puzzle, line_no, e)
+
+
+def error_record(puzzle, line_no: int, error: Exception) -> dict:
+    """出错题目的结果：题目id(若有)、行号、说明和异常类型"""
+    result = {'id': puzzle['id']} if isinstance(puzzle, dict) and 'id' in puzzle else {}
+    result.update({'line': line_no, 'status': 'error', 'error': str(error) or type(error).__name__,
+                   'error_type': type(error).__name__})
+    return result
+
+
+def iter_results(lines: Iterable[str], solver: Optional[VisualReasoningSolver] = None) -> Iterator[dict]:
+    """逐行求解，每次只持有一道题，内存占用与输入大小无关"""
+    if solver is None:
+        solver = VisualReasoningSolver()
+    for line_no, line in enumerate(lines, start=1):
+        line = line.strip()
+        if line:
+            yield solve_line(solver, line, line_no)
+
+
+def _init_worker(num_symbols: int, solve_mode: str = 'algebraic') -> None:
+    """工作进程初始化：构建求解器和排列表，之后的所有任务共用"""
+    global _worker_solver
+    _worker_solver = VisualReasoningSolver(solve_mode=solve_mode, num_symbols=num_symbols)
+
+
+def _solve_chunk(chunk: List[Tuple[int, str]]) -> List[dict]:
+    return [solve_line(_worker_solver, line, line_no) for line_no, line in chunk]
+
+
+def iter_chunks(lines: Iterable[str], chunk_size: int) -> Iterator[List[Tuple[int, str]]]:
+    """把非空行按chunk_size切块，保留行号"""
+    numbered = ((line_no, line.strip()) for line_no, line in enumerate(lines, start=1))
+    numbered = ((line_no, line) for line_no, line in numbered if line)
+    while True:
+        chunk = list(itertools.islice(numbered, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_results_parallel(lines: Iterable[str], workers: int, chunk_size: int = 1000,
+                          max_pending: Optional[int] = None, num_symbols: int = 4,
+                          solve_mode: str = 'algebraic') -> Iterator[dict]:
+    """多进程求解，结果按输入顺序输出
+
+    同时在途的块数不超过max_pending(默认为进程数的2倍)，
+    读取输入的速度受输出消费速度约束，内存占用与输入大小无关。
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size必须为正数")
+    if max_pending is None:
+        max_pending = workers * 2
+    max_pending = max(max_pending, 1)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(num_symbols, solve_mode)) as pool:
+        pending = deque()
+        for chunk in iter_chunks(lines, chunk_size):
+            pending.append(pool.submit(_solve_chunk, chunk))
+            if len(pending) >= max_pending:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def write_results(results: Iterable[dict], output: IO[str]) -> dict:
+    """把结果逐行写为JSON，返回各状态的计数"""
+    counts = {'ok': 0, 'no_solution': 0, 'error': 0}
+    for result in results:
+        output.write(json.dumps(result, ensure_ascii=False) + '\n')
+        counts[result['status']] += 1
+    return counts
+
+
+def run_batch(input_path: str, output_path: str = '-', num_symbols: int = 4, workers: int = 1,
+              chunk_size: int = 1000, max_pending: Optional[int] = None, solve_mode: str = 'algebraic',
+              solver: Optional[VisualReasoningSolver] = None) -> dict:
+    """批量求解入口，路径为 - 时使用标准输入/输出；workers大于1时使用多进程
+
+    单进程时可以传入已构建的solver(例如挂载了观测的求解器)。
+    """
+    source = sys.stdin if input_path == '-' else open(input_path, encoding='utf-8')
+    target = sys.stdout if output_path == '-' else open(output_path, 'w', encoding='utf-8')
+    try:
+        if workers > 1:
+            results = iter_results_parallel(source, workers, chunk_size, max_pending, num_symbols, solve_mode)
+        else:
+            if solver is None:
+                solver = VisualReasoningSolver(solve_mode=solve_mode, num_symbols=num_symbols)
+            results = iter_results(source, solver)
+        return write_results(results, target)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+        else:
+            target.flush()
@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+"""基准测试：按种子生成各题型的题目，计时各求解入口，输出可在提交之间比较的JSON报告
+
+    python -m benchmarks --output report.json
+    python -m benchmarks --compare report.json
+"""
+
+from benchmarks.generator import MODES, QUESTION_TYPES, PuzzleGenerator
+from benchmarks.runner import compare_reports, run_benchmarks
+
+__all__ = ['MODES', 'QUESTION_TYPES', 'PuzzleGenerator', 'compare_reports', 'run_benchmarks']
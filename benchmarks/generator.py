@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""按种子生成可解的题目，格式与批量模式的JSON行相同
+
+正确答案先随机选定，再用 VisualReasoningSolver.apply_permutation 逐级变换输入得到输出，
+因此每道题至少有一个解(求解结果的status都应为ok)，且同一种子总是生成相同的题目。
+"""
+
+import random
+from typing import Dict, List, Optional, Sequence
+
+from pipe_solver import VisualReasoningSolver
+
+QUESTION_TYPES = ('1', '2', '3', '4', '5', '6', '7', 'pipeline')
+# manual: 给出固定变换和选项; semi: 只给固定变换; auto: 只给输入输出(题型1-6)
+MODES = ('manual', 'semi', 'auto')
+# 题型1-6中可选变换是第几级(从0开始)
+_VARIABLE_INDEX = {'1': 0, '2': 1, '3': 0, '4': 0, '5': 1, '6': 2}
+
+
+class PuzzleGenerator:
+    """可复现的题目生成器"""
+
+    def __init__(self, seed: int = 0, num_symbols: int = 4, examples: int = 1, stages: int = 2,
+                 options: int = 3):
+        self.rng = random.Random(seed)
+        # 生成题目只用到逐级变换，不需要缓存和图谱
+        self.solver = VisualReasoningSolver(num_symbols=num_symbols, cache_size=0, atlas_path=None)
+        self.digits = list(self.solver.shapes)
+        self.digit_of = {shape: digit for digit, shape in self.solver.shapes.items()}
+        self.perms = self.solver.all_permutations
+        self.examples = examples
+        # 题型7的管道数、pipeline题型的级数
+        self.stages = stages
+        # 每一级的选项数(不超过全部排列数)
+        self.options = min(options, len(self.perms))
+
+    def _inputs(self) -> List[str]:
+        """随机输入序列(允许重复形状)，多组样例用逗号连接"""
+        n = len(self.digits)
+        return [''.join(self.rng.choice(self.digits) for _ in range(n)) for _ in range(self.examples)]
+
+    def _forward(self, inputs: Sequence[str], perms: Sequence[str]) -> List[str]:
+        """按 apply_permutation 的语义逐级变换每组输入"""
+        outputs = []
+        for digits in inputs:
+            sequence = self.solver.parse_sequence(digits)[0]
+            for perm in perms:
+                sequence = self.solver.apply_permutation(sequence, perm)
+            outputs.append(''.join(self.digit_of[shape] for shape in sequence))
+        return outputs
+
+    def _option_list(self, correct: str) -> List[str]:
+        """含正确答案的选项，正确答案的位置随机"""
+        options = self.rng.sample([perm for perm in self.perms if perm != correct], self.options - 1)
+        options.insert(self.rng.randrange(self.options), correct)
+        return options
+
+    def puzzle(self, question_type: str, mode: str = 'manual', puzzle_id: Optional[int] = None) -> Dict:
+        """生成一道题；题型7和pipeline只有manual模式"""
+        if question_type not in QUESTION_TYPES:
+            raise ValueError(f"未知题型: {question_type}")
+        if mode not in MODES:
+            raise ValueError(f"未知模式: {mode}")
+        inputs = self._inputs()
+        puzzle = {} if puzzle_id is None else {'id': puzzle_id}
+        puzzle['type'] = question_type
+
+        if question_type == 'pipeline':
+            # pipeline题型只有一组样例；每一级随机为固定变换、任意变换(null)或选项列表
+            inputs = inputs[:1]
+            perms = [self.rng.choice(self.perms) for _ in range(self.stages)]
+            stages = []
+            for perm in perms:
+                kind = self.rng.randrange(3)
+                stages.append(perm if kind == 0 else None if kind == 1 else self._option_list(perm))
+            puzzle['stages'] = stages
+        elif question_type == '7':
+            perms = [self.rng.choice(self.perms) for _ in range(self.stages)]
+            puzzle['pipes'] = [self._option_list(perm) for perm in perms]
+        else:
+            stage_count = 1 if question_type == '1' else 2 if question_type in ['2', '3'] else 3
+            # 自动模式不使用恒等变换，与 VisualReasoningSolver 的出题规则一致
+            candidates = self.perms[1:] if mode == 'auto' and len(self.perms) > 1 else self.perms
+            perms = [self.rng.choice(candidates) for _ in range(stage_count)]
+            variable_index = _VARIABLE_INDEX[question_type]
+            fixed = perms[:variable_index] + perms[variable_index + 1:]
+            if mode != 'auto' and fixed:
+                puzzle['fixed'] = fixed[0] if question_type in ['2', '3'] else fixed
+            if mode == 'manual':
+                puzzle['options'] = self._option_list(perms[variable_index])
+
+        outputs = self._forward(inputs, perms)
+        puzzle['input'] = ','.join(inputs)
+        puzzle['output'] = ','.join(outputs)
+        return puzzle
+
+    def puzzles(self, count: int, question_types: Sequence[str] = QUESTION_TYPES,
+                modes: Sequence[str] = ('manual',)) -> List[Dict]:
+        """轮流按题型和模式生成count道题"""
+        result = []
+        for i in range(count):
+            question_type = question_types[i % len(question_types)]
+            mode = modes[(i // len(question_types)) % len(modes)]
+            if question_type in ['7', 'pipeline']:
+                mode = 'manual'
+            result.append(self.puzzle(question_type, mode, puzzle_id=i + 1))
+        return result
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""计时各个求解入口，生成可在提交之间比较的JSON报告
+
+每个入口分两轮计时:
+    cold  新建的求解器(结果缓存为空)，并清空排列表和管道编译缓存
+    warm  同一个求解器把同一批调用再做repeat遍
+single 为直接调用求解方法；batch 为批量模式逐行求解(解析JSON + solve_puzzle)，
+workers大于1时另外给出多进程批量模式的吞吐量。
+"""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from batch_solver import iter_results_parallel, solve_line
+from benchmarks.generator import PuzzleGenerator
+from perm_engine import clear_caches
+from pipe_solver import SOLVE_MODES, VisualReasoningSolver
+from vector_engine import get_vector_engine
+
+REPORT_VERSION = 1
+# 比较报告时，吞吐量下降超过该比例视为退化
+REGRESSION_THRESHOLD = 0.10
+
+# 名称 -> (适用题型, 适用模式, 由 (求解器, 输入, 输出, 题目) 构造调用的函数)
+# 模式two_pipe为固定两条管道的题型7，不随--stages变化
+_Call = Callable[[VisualReasoningSolver, list, list, dict], object]
+METHODS: Dict[str, Tuple[Sequence[str], str, _Call]] = {
+    'auto_solve_q1': (['1'], 'auto', lambda s, i, o, p: s.auto_solve_q1(i, o)),
+    'auto_solve_q2_q3': (['2', '3'], 'auto', lambda s, i, o, p: s.auto_solve_q2_q3(i, o, p['type'])),
+    'auto_solve_q4_q6': (['4', '5', '6'], 'auto', lambda s, i, o, p: s.auto_solve_q4_q6(i, o, p['type'])),
+    'semi_auto_solve_q2_q3': (['2', '3'], 'semi',
+                              lambda s, i, o, p: s.semi_auto_solve_q2_q3(i, o, p['type'], p['fixed'])),
+    'semi_auto_solve_q4_q6': (['4', '5', '6'], 'semi',
+                              lambda s, i, o, p: s.semi_auto_solve_q4_q6(i, o, p['type'], *p['fixed'])),
+    'solve_q1': (['1'], 'manual', lambda s, i, o, p: s.solve_q1(i, o, p['options'])),
+    'solve_q2_q3': (['2', '3'], 'manual',
+                    lambda s, i, o, p: s.solve_q2_q3(i, o, p['fixed'], p['options'], p['type'])),
+    'solve_q4_q6': (['4', '5', '6'], 'manual',
+                    lambda s, i, o, p: s.solve_q4_q6(i, o, p['fixed'][0], p['fixed'][1], p['options'],
+                                                     int(p['type']) - 3)),
+    'solve_two_step_permutation': (['7'], 'two_pipe',
+                                   lambda s, i, o, p: s.solve_two_step_permutation(i, o, *p['pipes'])),
+}
+
+
+def percentile(ordered: Sequence[float], fraction: float) -> float:
+    """已排序样本的分位数(最近秩)"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(latencies: List[float], total: Optional[float] = None) -> dict:
+    """调用次数、吞吐量(次/秒)和延迟分位数(微秒)"""
+    ordered = sorted(latencies)
+    total = sum(latencies) if total is None else total
+    return {
+        'calls': len(latencies),
+        'total_s': round(total, 6),
+        'throughput': round(len(latencies) / total, 1) if total > 0 else 0.0,
+        'p50_us': round(percentile(ordered, 0.50) * 1e6, 2),
+        'p90_us': round(percentile(ordered, 0.90) * 1e6, 2),
+        'p99_us': round(percentile(ordered, 0.99) * 1e6, 2),
+        'max_us': round(ordered[-1] * 1e6, 2) if ordered else 0.0,
+    }
+
+
+def _time_calls(calls: List[Callable[[], object]]) -> List[float]:
+    latencies = []
+    clock = time.perf_counter
+    for call in calls:
+        start = clock()
+        call()
+        latencies.append(clock() - start)
+    return latencies
+
+
+def _new_solver(num_symbols: int, solve_mode: str, use_atlas: bool) -> VisualReasoningSolver:
+    """冷启动：新的结果缓存，并清空进程内的排列表和管道编译缓存"""
+    clear_caches()
+    get_vector_engine.cache_clear()
+    kwargs = {} if use_atlas else {'atlas_path': None}
+    return VisualReasoningSolver(solve_mode=solve_mode, num_symbols=num_symbols, **kwargs)
+
+
+def _time_phases(calls: List[Callable[[], object]], repeat: int) -> Tuple[dict, dict]:
+    """先冷启动计时一遍，再把warm轮重复repeat遍合并统计"""
+    cold = summarize(_time_calls(calls))
+    warm = []
+    for _ in range(max(1, repeat)):
+        warm.extend(_time_calls(calls))
+    return cold, summarize(warm)
+
+
+def bench_methods(puzzles: Dict[str, List[dict]], num_symbols: int, solve_mode: str,
+                  use_atlas: bool, repeat: int = 3) -> Dict[str, dict]:
+    """single: 逐个调用各求解方法，分cold/warm两轮"""
+    results = {}
+    for name, (question_types, mode, call) in METHODS.items():
+        selected = [p for p in puzzles[mode] if p['type'] in question_types]
+        if not selected:
+            continue
+        solver = _new_solver(num_symbols, solve_mode, use_atlas)
+        calls = []
+        for puzzle in selected:
+            input_seqs = solver.parse_sequence(puzzle['input'])
+            output_seqs = solver.parse_sequence(puzzle['output'])
+            calls.append(lambda i=input_seqs, o=output_seqs, p=puzzle: call(solver, i, o, p))
+        results[f'single/{name}/cold'], results[f'single/{name}/warm'] = _time_phases(calls, repeat)
+    return results
+
+
+def bench_batch(lines: List[str], num_symbols: int, solve_mode: str, use_atlas: bool,
+                repeat: int = 3, workers: int = 1) -> Tuple[Dict[str, dict], Dict[str, int]]:
+    """batch: 批量模式逐行求解，返回 (计时结果, 各status的数量)"""
+    results = {}
+    solver = _new_solver(num_symbols, solve_mode, use_atlas)
+    calls = [lambda line=line, line_no=line_no: solve_line(solver, line, line_no)
+             for line_no, line in enumerate(lines, 1)]
+    results['batch/solve_puzzle/cold'], results['batch/solve_puzzle/warm'] = _time_phases(calls, repeat)
+    # 计时之外再取一遍结果核对状态(此时都命中缓存)
+    statuses = Counter(call()['status'] for call in calls)
+    if workers > 1:
+        start = time.perf_counter()
+        count = sum(1 for _ in iter_results_parallel(lines, workers, num_symbols=num_symbols,
+                                                      solve_mode=solve_mode))
+        elapsed = time.perf_counter() - start
+        results[f'batch/parallel_{workers}'] = {
+            'calls': count,
+            'total_s': round(elapsed, 6),
+            'throughput': round(count / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+    return results, dict(statuses)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        output = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return output.stdout.strip() or None
+
+
+def run_benchmarks(count: int = 2000, seed: int = 0, num_symbols: int = 4, examples: int = 1,
+                   stages: int = 2, solve_mode: str = 'algebraic', use_atlas: bool = True,
+                   repeat: int = 3, workers: int = 1) -> dict:
+    """生成题目并计时全部入口，返回报告"""
+    def generate(modes):
+        return PuzzleGenerator(seed, num_symbols, examples, stages).puzzles(count, modes=modes)
+
+    puzzles = {mode: generate((mode,)) for mode in ('manual', 'semi', 'auto')}
+    puzzles['two_pipe'] = PuzzleGenerator(seed, num_symbols, examples, 2).puzzles(count, question_types=['7'])
+    lines = [json.dumps(puzzle, ensure_ascii=False) for puzzle in generate(('manual', 'semi', 'auto'))]
+
+    results = bench_methods(puzzles, num_symbols, solve_mode, use_atlas, repeat)
+    batch_results, statuses = bench_batch(lines, num_symbols, solve_mode, use_atlas, repeat, workers)
+    results.update(batch_results)
+    return {
+        'version': REPORT_VERSION,
+        'meta': {
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'count': count,
+            'seed': seed,
+            'num_symbols': num_symbols,
+            'examples': examples,
+            'stages': stages,
+            'solve_mode': solve_mode,
+            'atlas': use_atlas,
+            'repeat': repeat,
+            'workers': workers,
+        },
+        # 生成的题目都有解，非ok的数量说明求解出错
+        'statuses': statuses,
+        'results': results,
+    }
+
+
+def compare_reports(baseline: dict, current: dict,
+                    threshold: float = REGRESSION_THRESHOLD) -> List[Tuple[str, float, float, float, bool]]:
+    """逐项比较吞吐量，返回 (名称, 基准, 当前, 变化比例, 是否退化)"""
+    rows = []
+    for name, stats in current['results'].items():
+        old = baseline.get('results', {}).get(name)
+        if old is None or not old.get('throughput'):
+            continue
+        change = stats['throughput'] / old['throughput'] - 1
+        rows.append((name, old['throughput'], stats['throughput'], change, change < -threshold))
+    return rows
+
+
+def format_report(report: dict) -> str:
+    lines = [f"{'项目':<44}{'次数':>8}{'吞吐量/秒':>12}{'p50(us)':>10}{'p99(us)':>10}"]
+    for name, stats in report['results'].items():
+        # 多进程批量模式只有吞吐量
+        p50, p99 = (f"{stats['p50_us']:>10.2f}", f"{stats['p99_us']:>10.2f}") if 'p50_us' in stats else ('-'.rjust(10),) * 2
+        lines.append(f"{name:<44}{stats['calls']:>8}{stats['throughput']:>12.1f}{p50}{p99}")
+    return '\n'.join(lines)
+
+
+def format_comparison(rows: List[Tuple[str, float, float, float, bool]]) -> str:
+    lines = [f"{'项目':<44}{'基准':>12}{'当前':>12}{'变化':>9}"]
+    for name, old, new, change, regressed in rows:
+        lines.append(f"{name:<44}{old:>12.1f}{new:>12.1f}{change:>+9.1%}{'  退化' if regressed else ''}")
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description="求解器基准测试")
+    parser.add_argument("--count", type=int, default=2000, help="每种模式生成的题目数(默认2000)")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子(默认0)")
+    parser.add_argument("--symbols", type=int, default=4, help="形状数量(默认4)")
+    parser.add_argument("--examples", type=int, default=1, help="每道题的样例组数(默认1)")
+    parser.add_argument("--stages", type=int, default=2, help="题型7的管道数和pipeline题型的级数(默认2)")
+    parser.add_argument("--mode", default='algebraic', choices=SOLVE_MODES, help="求解模式(默认algebraic)")
+    parser.add_argument("--no-atlas", action="store_true", help="不使用答案图谱")
+    parser.add_argument("--repeat", type=int, default=3, help="warm轮的重复次数(默认3)")
+    parser.add_argument("--workers", type=int, default=1, help="另外测量多进程批量模式(默认不测)")
+    parser.add_argument("--output", metavar="FILE", help="把报告写成JSON文件")
+    parser.add_argument("--compare", metavar="FILE", help="与之前的报告比较，有退化时返回1")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.count, args.seed, args.symbols, args.examples, args.stages, args.mode,
+                            not args.no_atlas, args.repeat, args.workers)
+    print(format_report(report))
+    if report['statuses'].keys() - {'ok'}:
+        print(f"警告: 存在未成功求解的题目 {report['statuses']}", file=sys.stderr)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            rows = compare_reports(json.load(f), report)
+        print()
+        print(format_comparison(rows))
+        if any(regressed for *_, regressed in rows):
+            return 1
+    return 0
@@ -2,56 +2,255 @@
 # -*- coding: utf-8 -*-
 
 import argparse
+import bisect
+import functools
+import hashlib
+import itertools
+import mmap
+import os
+import struct
 
-expression_map = {
-    "□+□+□": lambda a, b, c, d=None: a + b + c,
-    "□−□+□": lambda a, b, c, d=None: a - b + c,
-    "□×□+□": lambda a, b, c, d=None: a * b + c,
-    "□×□−□": lambda a, b, c, d=None: a * b - c,
-    "□×□×□": lambda a, b, c, d=None: a * b * c,
-    "□+□+□+□": lambda a, b, c, d: a + b + c + d,
-    "□+□+□−□": lambda a, b, c, d: a + b + c - d,
-    "□×□+□+□": lambda a, b, c, d: a * b + c + d,
-    "□×□+□−□": lambda a, b, c, d: a * b + c - d,
-    "□×□×□+□": lambda a, b, c, d: a * b * c + d,
-    "□×□×□−□": lambda a, b, c, d: a * b * c - d,
-}
+import expr_solver
+from expr_compiler import TemplateError, compile_template
+
+# 不在 PATTERNS 中的模式，空位数不超过该值时直接枚举全部数字组合
+ENUMERATE_MAX_SLOTS = 4
+
+# 新的模式直接加在这里，由 expr_compiler 编译为求值函数
+PATTERNS = (
+    "□+□+□",
+    "□−□+□",
+    "□×□+□",
+    "□×□−□",
+    "□×□×□",
+    "□+□+□+□",
+    "□+□+□−□",
+    "□×□+□+□",
+    "□×□+□−□",
+    "□×□×□+□",
+    "□×□×□−□",
+)
+
+expression_map = {pattern: compile_template(pattern) for pattern in PATTERNS}
+
+
+def iter_expressions(pattern: str):
+    """按数字的字典序给出 (数字, 结果, 表达式)，数字互不相同，可互换的空位只取递增的一种
+
+    结果不是整数(含÷的模式)的取值跳过。
+    """
+    template = compile_template(pattern)
+    evaluate = template.evaluate
+    groups = template.symmetric_groups
+    for nums in itertools.permutations(range(1, 10), template.arity):
+        if any(nums[i] > nums[j] for slots in groups for i, j in zip(slots, slots[1:])):
+            continue
+        result = evaluate(*nums)
+        if result is not None:
+            yield nums, result, template.format(nums)
 
 
 def generate_expressions():
-    expr_db = []
-    for a in range(1, 10):
-        for b in range(1, 10):
-            for c in range(1, 10):
-                for d in range(1, 10):
-                    for key, func in expression_map.items():
-                        num_placeholders = key.count("□")
-                        nums = [a, b, c, d][:num_placeholders]
-                        if len(set(nums)) < num_placeholders:
-                            continue
-                        try:
-                            result = func(a, b, c, d)
-                            expr = key.replace("□", "{}").format(*nums)
-                            expr_db.append((key, result, expr))
-                        except Exception:
-                            continue
-    return expr_db
+    return [(key, result, expr) for key in expression_map for _, result, expr in iter_expressions(key)]
 
 
 def find_expression(expr_db, pattern: str, target: int):
+    # Without a database, answer from the index or the value-set solver
+    if expr_db is None:
+        return lookup(pattern, target)
     for pat, val, expr in expr_db:
         if pat == pattern and val == target:
             return expr.replace("*", "×").replace("-", "−")
     return None
 
 
+# (pattern, target) -> 全部表达式(按数字字典序)，首次查询时打开索引文件，之后每次查询只需一次二分查找
+_expression_index = None
+
+# 索引文件，与本模块放在同一目录
+INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "calc_index.bin")
+INDEX_MAGIC = b"CIDX"
+INDEX_VERSION = 1
+# magic, 版本, expression_map的内容哈希, 模式数
+_HEADER = struct.Struct("<4sB16sH")
+# 每种模式: 空位数, 结果个数, 结果数组偏移, 起始下标数组偏移, 数字数组偏移
+_ENTRY = struct.Struct("<BIIII")
+_TARGET = struct.Struct("<i")
+_START = struct.Struct("<I")
+
+
+def build_index():
+    """按 (模式, 结果) 分组全部表达式"""
+    index = {}
+    for key in expression_map:
+        for _, result, expr in iter_expressions(key):
+            index.setdefault((key, result), []).append(expr.replace("*", "×").replace("-", "−"))
+    return {key: tuple(exprs) for key, exprs in index.items()}
+
+
+def content_hash():
+    """expression_map(模式及其生成的求值代码)的哈希，任何改动都会使旧索引文件失效"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(INDEX_VERSION).encode())
+    for key, template in expression_map.items():
+        digest.update(key.encode("utf-8"))
+        digest.update(template.source.encode("utf-8"))
+        digest.update(repr(template.symmetric_groups).encode("utf-8"))
+    return digest.digest()
+
+
+def build_index_file(path: str = INDEX_PATH):
+    """写入索引文件，返回字节数
+
+    每种模式的结果升序存放，起始下标数组给出每个结果在数字数组中的范围，
+    数字数组按空位数把每组数字存为若干字节。
+    """
+    sections = []
+    entries = []
+    position = _HEADER.size + _ENTRY.size * len(expression_map)
+    for key in expression_map:
+        arity = key.count("□")
+        grouped = {}
+        for nums, result, _ in iter_expressions(key):
+            grouped.setdefault(result, []).append(nums)
+        targets = sorted(grouped)
+        starts = [0]
+        digits = bytearray()
+        for target in targets:
+            for nums in grouped[target]:
+                digits += bytes(nums)
+            starts.append(starts[-1] + len(grouped[target]))
+        target_data = b"".join(_TARGET.pack(target) for target in targets)
+        start_data = b"".join(_START.pack(start) for start in starts)
+        entries.append(_ENTRY.pack(arity, len(targets), position, position + len(target_data),
+                                   position + len(target_data) + len(start_data)))
+        sections += [target_data, start_data, bytes(digits)]
+        position += len(target_data) + len(start_data) + len(digits)
+
+    data = _HEADER.pack(INDEX_MAGIC, INDEX_VERSION, content_hash(), len(expression_map)) \
+        + b"".join(entries) + b"".join(sections)
+    # 先写临时文件再替换，其他进程同时重建或正在映射旧文件都不受影响
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+    return len(data)
+
+
+class _Targets:
+    """内存映射中某种模式的结果数组，供 bisect 二分查找"""
+
+    def __init__(self, data, offset, count):
+        self.data, self.offset, self.count = data, offset, count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        return _TARGET.unpack_from(self.data, self.offset + i * _TARGET.size)[0]
+
+
+class ExpressionIndex:
+    """只读的表达式索引，内存映射文件后按结果二分查找；多个进程共享同一份页缓存"""
+
+    def __init__(self, path: str = INDEX_PATH):
+        with open(path, "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, digest, count = _HEADER.unpack_from(self._data, 0)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION or digest != content_hash() \
+                or count != len(expression_map):
+            self._data.close()
+            raise ValueError(f"表达式索引与当前的 expression_map 不符: {path}")
+        self._entries = {}
+        for i, key in enumerate(expression_map):
+            arity, size, targets, starts, digits = _ENTRY.unpack_from(self._data, _HEADER.size + i * _ENTRY.size)
+            self._entries[key] = (arity, _Targets(self._data, targets, size), starts, digits,
+                                  key.replace("□", "{}"))
+
+    def close(self):
+        self._data.close()
+
+    def get(self, key, default=()):
+        """与 build_index() 的字典相同: (模式, 结果) -> 全部表达式"""
+        pattern, target = key
+        entry = self._entries.get(pattern)
+        if entry is None:
+            return default
+        arity, targets, starts, digits, template = entry
+        i = bisect.bisect_left(targets, target)
+        if i == len(targets) or targets[i] != target:
+            return default
+        first, last = struct.unpack_from("<2I", self._data, starts + i * _START.size)
+        data = self._data[digits + first * arity:digits + last * arity]
+        return tuple(template.format(*data[j:j + arity]).replace("*", "×").replace("-", "−")
+                     for j in range(0, len(data), arity))
+
+
+def load_index(path: str = INDEX_PATH):
+    """映射索引文件，不存在或已过期时先重建；无法写入时返回None"""
+    try:
+        return ExpressionIndex(path)
+    except (OSError, ValueError, struct.error):
+        pass
+    try:
+        build_index_file(path)
+        return ExpressionIndex(path)
+    except (OSError, ValueError):
+        return None
+
+
+def expression_index():
+    global _expression_index
+    if _expression_index is None:
+        # 索引文件不可用时在内存中构建
+        _expression_index = load_index() or build_index()
+    return _expression_index
+
+
+@functools.lru_cache(maxsize=None)
+def _pattern_index(pattern: str):
+    """不在 PATTERNS 中的模式: 结果 -> 全部表达式，每种模式只枚举一次"""
+    index = {}
+    for _, result, expr in iter_expressions(pattern):
+        index.setdefault(result, []).append(expr.replace("*", "×").replace("-", "−"))
+    return {result: tuple(exprs) for result, exprs in index.items()}
+
+
+def find_expressions(pattern: str, target: int):
+    """所有结果为target的表达式，第一个与 find_expression 的结果相同"""
+    if pattern not in expression_map:
+        return _pattern_index(pattern).get(target, ())
+    return expression_index().get((pattern, target), ())
+
+
+def lookup(pattern: str, target: int, max_digit: int = 9):
+    """结果为target的第一个表达式
+
+    PATTERNS 中的模式查索引，空位不多的其他模式枚举一次后查表；
+    空位更多或数字范围不是1-9时用 expr_solver 的值集动态规划，不枚举全部数字组合。
+    """
+    if max_digit != 9 or (pattern not in expression_map
+                          and compile_template(pattern).arity > ENUMERATE_MAX_SLOTS):
+        return expr_solver.find_expression(pattern, target, range(1, max_digit + 1))
+    matches = find_expressions(pattern, target)
+    return matches[0] if matches else None
+
+
+def pattern_arg(value: str):
+    try:
+        compile_template(value)
+    except TemplateError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return value
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "--pattern",
         required=False,
-        choices=list(expression_map.keys()),
-        help="选择计算模式",
+        type=pattern_arg,
+        help="计算模式，如 □×□+□；也可以是任意由 □ + − × ÷ 和括号组成的模式",
     )
     parser.add_argument(
         "--target",
@@ -59,8 +258,24 @@ def main():
         type=int,
         help="目标值（整数）",
     )
+    parser.add_argument(
+        "--max-digit",
+        type=int,
+        default=9,
+        help="每个□可用的数字为1到该值(默认9)，数字互不相同",
+    )
+    parser.add_argument(
+        "--build-index",
+        action="store_true",
+        help="重新生成表达式索引文件后退出",
+    )
     args = parser.parse_args()
 
+    if args.build_index:
+        size = build_index_file()
+        print(f"已生成表达式索引: {INDEX_PATH} ({size}字节)")
+        return
+
     # If not provided, enter interactive mode
     if args.pattern is None or args.target is None:
         patterns = list(expression_map.keys())
@@ -78,17 +293,24 @@ def main():
                 args.pattern = patterns[sel_idx - 1]
                 break
             print("编号超出范围")
-        # Input target
+        # Input targets, one per line; blank line to finish
         while True:
-            t = input("请输入目标整数 target: ").strip()
+            t = input("请输入目标整数 target (直接回车结束): ").strip()
+            if not t:
+                break
             try:
                 args.target = int(t)
-                break
             except Exception:
                 print("请输入有效整数")
+                continue
+            show(args.pattern, args.target, args.max_digit)
+        return
+
+    show(args.pattern, args.target, args.max_digit)
+
 
-    database = generate_expressions()
-    matched = find_expression(database, args.pattern, args.target)
+def show(pattern: str, target: int, max_digit: int = 9):
+    matched = lookup(pattern, target, max_digit)
     if matched is None:
         print("未找到匹配")
     else:
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""干扰项生成与选项检查，基于输出等价类
+
+对可选那一级的输入序列，输出相同的排列归为一类(输入稳定子群的陪集，按重复形状的模式预先算好)。
+从正确答案所在类和“平凡类”(输出等于输入，含恒等变换)以外的类中各取一个代表，
+得到的干扰项保证错误、两两输出不同且都不是平凡变换，每个选项只需常数时间。
+多组样例时按各组输出组成的元组分类。
+"""
+
+from typing import Dict, List, Sequence, Tuple
+
+from perm_engine import PermutationEngine
+
+
+class DistractorGenerator:
+    """按输出等价类出干扰项、检查选项"""
+
+    def __init__(self, engine: PermutationEngine):
+        self.engine = engine
+
+    def classes(self, states: Sequence[int]) -> Tuple[Tuple[Tuple[int, ...], ...], Tuple[int, ...]]:
+        """可选那一级的输入为states(每组样例一个编码)时的 (各类排列, 每个排列所属的类)"""
+        if len(states) == 1:
+            return self.engine.output_classes(states[0])
+        groups: Dict[tuple, List[int]] = {}
+        for perm_id, row in enumerate(self.engine.action):
+            groups.setdefault(tuple(row[x] for x in states), []).append(perm_id)
+        # 按编号顺序加入，各类已按最小编号排序，恒等变换所在类为第0类
+        classes = tuple(tuple(group) for group in groups.values())
+        class_of = [0] * len(self.engine.perms)
+        for index, group in enumerate(classes):
+            for perm_id in group:
+                class_of[perm_id] = index
+        return classes, tuple(class_of)
+
+    def distractors(self, states: Sequence[int], correct: int, count: int) -> List[int]:
+        """至多count个干扰项(排列编号)，按编号顺序从各类中取代表"""
+        classes, class_of = self.classes(states)
+        skip = {class_of[correct], class_of[self.engine.identity]}
+        picked = []
+        for index, group in enumerate(classes):
+            if index not in skip:
+                picked.append(group[0])
+                if len(picked) >= count:
+                    break
+        return picked
+
+    def options(self, states: Sequence[int], correct: int, count: int = 3) -> List[int]:
+        """含正确答案的count个选项，正确答案排第一
+
+        等价类不够时(重复形状很多)选项会少于count个。
+        """
+        return [correct] + self.distractors(states, correct, count - 1)
+
+    def analyze(self, states: Sequence[int], correct_mask: int, options: Sequence[int]) -> dict:
+        """检查一组选项(排列编号)：正确的、平凡的(输出等于输入)、输出相同无法区分的，编号从1开始"""
+        _, class_of = self.classes(states)
+        trivial = class_of[self.engine.identity]
+        seen: Dict[int, int] = {}
+        duplicates = []
+        for number, perm_id in enumerate(options, 1):
+            first = seen.setdefault(class_of[perm_id], number)
+            if first != number:
+                duplicates.append([first, number])
+        correct = [number for number, perm_id in enumerate(options, 1) if correct_mask >> perm_id & 1]
+        return {
+            'correct': correct,
+            'trivial': [number for number, perm_id in enumerate(options, 1) if class_of[perm_id] == trivial],
+            'duplicates': duplicates,
+            'ambiguous': len(correct) != 1,
+        }
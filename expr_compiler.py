@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""计算器模式的编译器：把 "□×(□+□)÷□" 这样的模式解析成表达式树，生成专用的求值函数
+
+支持 □、+、−、×、÷ 和括号(也接受 - * /)，×÷ 优先于 +−，同级从左到右。
+每种模式生成一次Python源码并编译，求值函数只做算术:
+    □×□+□   ->  def evaluate(a0, a1, a2): return a0 * a1 + a2
+含 ÷ 的模式用 Fraction 精确计算，结果不是整数或除数为0时返回None。
+"""
+
+from fractions import Fraction
+from functools import lru_cache
+from typing import Callable, List, Optional, Sequence, Tuple, Union
+
+SLOT = "□"
+# 字符 -> 运算(加减为 + -，乘除为 * /)
+_OPERATORS = {"+": "+", "−": "-", "-": "-", "×": "*", "*": "*", "÷": "/", "/": "/"}
+_PRECEDENCE = {"+": 1, "-": 1, "*": 2, "/": 2}
+
+# 表达式树: 空位为其下标(int)，运算为 (运算符, 左, 右)
+Node = Union[int, Tuple[str, "Node", "Node"]]
+
+
+class TemplateError(ValueError):
+    """模式无法解析"""
+
+
+class _Parser:
+    """递归下降: expr := term (('+'|'-') term)*, term := atom (('*'|'/') atom)*, atom := □ | '(' expr ')'"""
+
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        self.tokens = [_OPERATORS.get(c, c) for c in pattern if not c.isspace()]
+        self.pos = 0
+        self.slots = 0
+
+    def parse(self) -> Node:
+        if not self.tokens:
+            raise TemplateError("模式为空")
+        node = self.expr()
+        if self.pos != len(self.tokens):
+            self.fail()
+        return node
+
+    def fail(self):
+        found = self.tokens[self.pos] if self.pos < len(self.tokens) else "结尾"
+        raise TemplateError(f"无法解析模式 {self.pattern!r}: 第{self.pos + 1}个符号 {found!r}")
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def binary(self, operators: Tuple[str, ...], operand: Callable[[], Node]) -> Node:
+        node = operand()
+        while self.peek() in operators:
+            op = self.tokens[self.pos]
+            self.pos += 1
+            node = (op, node, operand())
+        return node
+
+    def expr(self) -> Node:
+        return self.binary(("+", "-"), self.term)
+
+    def term(self) -> Node:
+        return self.binary(("*", "/"), self.atom)
+
+    def atom(self) -> Node:
+        token = self.peek()
+        if token == SLOT:
+            self.pos += 1
+            self.slots += 1
+            return self.slots - 1
+        if token == "(":
+            self.pos += 1
+            node = self.expr()
+            if self.peek() != ")":
+                self.fail()
+            self.pos += 1
+            return node
+        self.fail()
+
+
+def _source(node: Node, wrap: str, parent: int = 0, right: bool = False) -> str:
+    """生成Python表达式，只在优先级需要时加括号"""
+    if isinstance(node, int):
+        return wrap.format(f"a{node}")
+    op, left, right_node = node
+    precedence = _PRECEDENCE[op]
+    text = f"{_source(left, wrap, precedence)} {op} {_source(right_node, wrap, precedence, True)}"
+    # 右侧同级运算需要括号: a-(b+c)、a/(b*c)
+    if precedence < parent or (right and precedence == parent):
+        return f"({text})"
+    return text
+
+
+def chain_terms(node: Node, operators: str, sign: str) -> List[Tuple[str, Node]]:
+    """把同级的连加减/连乘除展开为 (符号, 操作数)，减号、除号右侧的符号取反"""
+    if isinstance(node, int) or node[0] not in operators:
+        return [(sign, node)]
+    op, left, right = node
+    flipped = {"+": "-", "-": "+", "*": "/", "/": "*"}[sign] if op in "-/" else sign
+    return chain_terms(left, operators, sign) + chain_terms(right, operators, flipped)
+
+
+def _symmetric_groups(node: Node) -> List[List[int]]:
+    """同一运算链中符号相同的单个□可以互换而结果不变"""
+    groups: List[List[int]] = []
+
+    def visit(node: Node):
+        if isinstance(node, int):
+            return
+        operators, sign = ("+-", "+") if node[0] in "+-" else ("*/", "*")
+        slots = {}
+        for sign, operand in chain_terms(node, operators, sign):
+            if isinstance(operand, int):
+                slots.setdefault(sign, []).append(operand)
+            else:
+                visit(operand)
+        groups.extend(sorted(group) for group in slots.values() if len(group) > 1)
+
+    visit(node)
+    return sorted(groups)
+
+
+class Template:
+    """编译后的模式
+
+    tree 为表达式树(空位按从左到右编号)；evaluate(*数字) 返回整数结果(不是整数时为None)；
+    format(数字) 给出输出用的表达式；
+    symmetric_groups 为可以互换而结果不变的空位(同一运算链中符号相同的单个□)。
+    """
+
+    __slots__ = ("pattern", "arity", "tree", "exact", "source", "evaluate", "symmetric_groups", "_template")
+
+    def __init__(self, pattern: str):
+        parser = _Parser(pattern)
+        tree = parser.parse()
+        self.pattern = pattern
+        self.arity = parser.slots
+        self.tree = tree
+        # 含÷时需要用分数精确计算
+        self.exact = "/" in parser.tokens
+        args = ", ".join(f"a{i}" for i in range(self.arity))
+        if self.exact:
+            self.source = (f"def evaluate({args}):\n"
+                           f"    try:\n"
+                           f"        r = {_source(tree, 'F({})')}\n"
+                           f"    except ZeroDivisionError:\n"
+                           f"        return None\n"
+                           f"    return r.numerator if r.denominator == 1 else None\n")
+        else:
+            self.source = f"def evaluate({args}):\n    return {_source(tree, '{}')}\n"
+        namespace = {"F": Fraction}
+        exec(compile(self.source, f"<template {pattern}>", "exec"), namespace)
+        self.evaluate: Callable[..., Optional[int]] = namespace["evaluate"]
+        self.symmetric_groups = _symmetric_groups(tree)
+        self._template = pattern.replace(SLOT, "{}")
+
+    def __call__(self, *nums: int) -> Optional[int]:
+        return self.evaluate(*nums)
+
+    def format(self, nums: Sequence[int]) -> str:
+        return self._template.format(*nums)
+
+    def __repr__(self):
+        return f"Template({self.pattern!r})"
+
+
+@lru_cache(maxsize=None)
+def compile_template(pattern: str) -> Template:
+    """编译一个模式(同一模式只编译一次)"""
+    return Template(pattern)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""计算器模式的值集动态规划：不枚举全部数字组合，回答"模式能否得到目标值、用哪些数字"
+
+编译后的表达式树中，每棵子树求出 {已用数字的位掩码: {可达的值: 字典序最小的数字组合}}，
+自底向上合并(掩码不相交才能合并，保证数字互不相同)。连加减、连乘除按结合律从中间分成两段
+(减号、除号并入项的符号)，使两侧的表都尽量小。根上不再合并整张表，而是对左段每个值
+反解出右段需要的值，到按值分组的右表中查找(在最后一个运算上相遇)。
+字典序最小的组合与按 itertools.permutations 逐个枚举时第一个命中的组合相同。
+5-7个空位或更宽的数字范围时，代价取决于各子树可达值的个数，而不是数字组合数。
+"""
+
+from fractions import Fraction
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from expr_compiler import Node, Template, chain_terms, compile_template
+
+DIGITS = tuple(range(1, 10))
+
+# 位掩码 -> {值: 字典序最小的数字组合}
+Table = Dict[int, Dict[object, Tuple[int, ...]]]
+
+
+def _size(node: Node) -> int:
+    """子树中的空位数"""
+    return 1 if isinstance(node, int) else _size(node[1]) + _size(node[2])
+
+
+def _terms(node: Node) -> Tuple[bool, List[Tuple[str, Node]]]:
+    """把根上的连加减/连乘除展开为带符号的项，返回 (是否为加减, 各项)"""
+    additive = node[0] in "+-"
+    return additive, chain_terms(node, "+-" if additive else "*/", "+" if additive else "*")
+
+
+def _signed(table: Table, sign: str) -> Table:
+    """减号取相反数、除号取倒数(除数为0的值丢弃)"""
+    if sign in "+*":
+        return table
+    if sign == "-":
+        return {mask: {-value: digits for value, digits in values.items()} for mask, values in table.items()}
+    return {mask: {1 / value: digits for value, digits in values.items() if value != 0}
+            for mask, values in table.items()}
+
+
+def _combine(additive: bool, left_table: Table, right_table: Table) -> Table:
+    """合并相邻两段(左段的空位都在右段之前，数字组合直接拼接)"""
+    table: Table = {}
+    for left_mask, left_values in left_table.items():
+        for right_mask, right_values in right_table.items():
+            if left_mask & right_mask:
+                continue
+            values = table.setdefault(left_mask | right_mask, {})
+            for a, left_digits in left_values.items():
+                for b, right_digits in right_values.items():
+                    value = a + b if additive else a * b
+                    combined = left_digits + right_digits
+                    best = values.get(value)
+                    if best is None or combined < best:
+                        values[value] = combined
+    return table
+
+
+def _split(terms: List[Tuple[str, Node]]) -> int:
+    """按空位数把各项分成大致相等的两段"""
+    sizes = [_size(node) for _, node in terms]
+    total, running = sum(sizes), 0
+    for index, size in enumerate(sizes[:-1], 1):
+        running += size
+        if 2 * running >= total:
+            return index
+    return len(terms) - 1
+
+
+def _chain_table(additive: bool, terms: List[Tuple[str, Node]], digits: Tuple[int, ...], exact: bool) -> Table:
+    """一段带符号的项之和(或之积)；利用结合律从中间分开，两侧的表都尽量小"""
+    if len(terms) == 1:
+        sign, node = terms[0]
+        return _signed(_table(node, digits, exact), sign)
+    split = _split(terms)
+    return _combine(additive, _chain_table(additive, terms[:split], digits, exact),
+                    _chain_table(additive, terms[split:], digits, exact))
+
+
+def _table(node: Node, digits: Tuple[int, ...], exact: bool) -> Table:
+    """子树的全部可达值，按用到的数字分组"""
+    if isinstance(node, int):
+        number = Fraction if exact else int
+        return {1 << i: {number(d): (d,)} for i, d in enumerate(digits)}
+    additive, terms = _terms(node)
+    return _chain_table(additive, terms, digits, exact)
+
+
+def _by_value(table: Table) -> Dict[object, List[Tuple[int, Tuple[int, ...]]]]:
+    grouped: Dict[object, List[Tuple[int, Tuple[int, ...]]]] = {}
+    for mask, values in table.items():
+        for value, digits in values.items():
+            grouped.setdefault(value, []).append((mask, digits))
+    return grouped
+
+
+@lru_cache(maxsize=64)
+def _root_tables(pattern: str, digits: Tuple[int, ...]):
+    """根上两段的表(右段按值分组)，同一模式和数字范围的多次查询共用
+
+    返回 (是否为加减, 左表, 右表)；模式只有一个空位时为 (None, 表, None)。
+    """
+    template = compile_template(pattern)
+    tree = template.tree
+    if isinstance(tree, int):
+        return None, _table(tree, digits, template.exact), None
+    additive, terms = _terms(tree)
+    split = _split(terms)
+    left_table = _chain_table(additive, terms[:split], digits, template.exact)
+    right_table = _chain_table(additive, terms[split:], digits, template.exact)
+    return additive, left_table, _by_value(right_table)
+
+
+def _needed(additive: bool, target, a, exact: bool) -> Optional[list]:
+    """根上为 a + b = target 或 a × b = target 时右段需要的值；返回None表示任意值都可以"""
+    if additive:
+        return [target - a]
+    if a == 0:
+        return None if target == 0 else []
+    if exact:
+        return [Fraction(target) / a]
+    return [target // a] if target % a == 0 else []
+
+
+def solve(pattern: str, target: int, digits: Iterable[int] = DIGITS) -> Optional[Tuple[int, ...]]:
+    """模式取值为target的字典序最小的数字组合(数字互不相同)，不存在时返回None"""
+    digits = tuple(digits)
+    template: Template = compile_template(pattern)
+    if template.arity > len(digits):
+        return None
+    additive, left_table, right_by_value = _root_tables(pattern, digits)
+    if additive is None:
+        return min((found[target] for found in left_table.values() if target in found), default=None)
+
+    best = None
+    for left_mask, left_values in left_table.items():
+        for a, left_digits in left_values.items():
+            # 左段的组合已经大于当前最优解的前缀，拼上任何右段都不会更小
+            if best is not None and left_digits > best[:len(left_digits)]:
+                continue
+            needed = _needed(additive, target, a, template.exact)
+            if needed is None:
+                candidates = [entry for entries in right_by_value.values() for entry in entries]
+            else:
+                candidates = [entry for value in needed for entry in right_by_value.get(value, ())]
+            for right_mask, right_digits in candidates:
+                if not left_mask & right_mask:
+                    combined = left_digits + right_digits
+                    if best is None or combined < best:
+                        best = combined
+    return best
+
+
+def find_expression(pattern: str, target: int, digits: Iterable[int] = DIGITS) -> Optional[str]:
+    """同 calculator.find_expression 的返回值，不需要表达式库"""
+    found = solve(pattern, target, digits)
+    if found is None:
+        return None
+    return compile_template(pattern).format(found).replace("*", "×").replace("-", "−")
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""可选的运行时观测：调用计数、搜索空间统计、分阶段计时和性能分析
+
+默认不启用，求解器本身不做任何检查。Instrumentation.attach() 只在某个求解器实例上
+用包装函数覆盖被观测的方法，detach() 后恢复原方法，因此未挂载时没有任何额外开销。
+
+    with Instrumentation(solver, hooks=[CsvTrace('trace.csv')]) as probe:
+        solver.solve_puzzle(puzzle)
+    probe.snapshot()
+
+各阶段的耗时包含其内部调用(solve_puzzle 的时间里含 solve_stages)。
+"""
+
+import cProfile
+import csv
+import inspect
+import io
+import json
+import pstats
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import IO, Callable, Dict, Iterator, List, Optional, Sequence
+
+from perm_engine import Stage
+
+# 计时的求解阶段
+PHASES = (
+    'solve_puzzle',
+    'auto_solve_q1', 'auto_solve_q2_q3', 'auto_solve_q4_q6',
+    'semi_auto_solve_q2_q3', 'semi_auto_solve_q4_q6',
+    'solve_q1', 'solve_q2_q3', 'solve_q4_q6', 'solve_two_step_permutation',
+    'solve_stages', 'count_stages', 'match_options',
+)
+PROFILE_MODES = ('stats', 'trace', 'cprofile', 'tracemalloc')
+
+# hook(事件, 阶段名, 耗时秒数, 附加信息)
+Hook = Callable[[str, str, float, dict], None]
+
+
+class Instrumentation:
+    """挂载到一个求解器实例上，累计计数与耗时，并把每次阶段调用转发给hooks"""
+
+    def __init__(self, solver, hooks: Sequence[Hook] = ()):
+        self.solver = solver
+        self.hooks = list(hooks)
+        self.counters = Counter()
+        # 阶段名 -> [调用次数, 总耗时]
+        self.phases: Dict[str, List[float]] = {}
+        # 第i级 -> 候选数/被排除数(只统计返回了全部解的搜索)
+        self.stages: Dict[int, Counter] = {}
+        # 被覆盖的 (对象, 方法名)
+        self._wrapped: List[tuple] = []
+        self._cache_base = None
+        # 挂载时引擎的排列应用次数，未挂载时为None
+        self._applications_base: Optional[int] = None
+
+    def attach(self) -> 'Instrumentation':
+        if self._wrapped:
+            return self
+        solver = self.solver
+        for name in PHASES:
+            self._wrap(solver, name, self._timed(name, getattr(solver, name)))
+        # 惰性搜索返回迭代器，只计次数
+        self._wrap(solver, 'iter_stages', self._counted('iter_stages', solver.iter_stages))
+        if solver.atlas is not None:
+            self._wrap(solver.atlas, 'solve', self._atlas_lookup(solver.atlas.solve))
+        if solver.cache is not None:
+            self._cache_base = (solver.cache.hits, solver.cache.misses)
+        # 搜索中的每次查表和 apply_permutation 都记为一次排列应用
+        solver.engine.count_applications(True)
+        self._applications_base = solver.engine.applications
+        return self
+
+    def detach(self) -> None:
+        if not self._wrapped:
+            return
+        for owner, name in self._wrapped:
+            # 删除实例属性即恢复类上的方法
+            delattr(owner, name)
+        self._wrapped.clear()
+        self.counters['apply_permutation'] += self._applications()
+        self._applications_base = None
+        self.solver.engine.count_applications(False)
+
+    def _applications(self) -> int:
+        """挂载以来引擎的排列应用次数"""
+        if self._applications_base is None:
+            return 0
+        return self.solver.engine.applications - self._applications_base
+
+    def __enter__(self) -> 'Instrumentation':
+        return self.attach()
+
+    def __exit__(self, *exc) -> None:
+        self.detach()
+
+    def _wrap(self, owner, name: str, wrapper: Callable) -> None:
+        setattr(owner, name, wrapper)
+        self._wrapped.append((owner, name))
+
+    def _counted(self, name: str, method: Callable) -> Callable:
+        counters = self.counters
+
+        def wrapper(*args, **kwargs):
+            counters[name] += 1
+            return method(*args, **kwargs)
+        return wrapper
+
+    def _atlas_lookup(self, method: Callable) -> Callable:
+        counters = self.counters
+
+        def wrapper(*args, **kwargs):
+            result = method(*args, **kwargs)
+            counters['atlas_hits' if result is not None else 'atlas_misses'] += 1
+            return result
+        return wrapper
+
+    def _timed(self, name: str, method: Callable) -> Callable:
+        clock = time.perf_counter
+        signature = inspect.signature(method)
+
+        def wrapper(*args, **kwargs):
+            start = clock()
+            result = method(*args, **kwargs)
+            elapsed = clock() - start
+            # 计时之外再按参数名取参数，位置和关键字调用都适用
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            info = self._describe(name, bound.arguments, result)
+            self._record(info.pop('phase', name), elapsed, info)
+            return result
+        return wrapper
+
+    def _describe(self, name: str, arguments: dict, result) -> dict:
+        """按阶段补充附加信息，并累计各级候选与排除的数量"""
+        if name == 'solve_puzzle':
+            puzzle = arguments['puzzle']
+            question_type = str(puzzle.get('type', '')) if isinstance(puzzle, dict) else ''
+            return {'phase': f'solve_puzzle[{question_type}]', 'status': result.get('status')}
+        if name == 'solve_stages':
+            self.counters[f'search.{self.solver.solve_mode}'] += 1
+            stages = arguments['stages']
+            info = {'stages': len(stages), 'solutions': len(result)}
+            # limit截断时返回的解不代表全部可行候选，不计入各级统计
+            if arguments['limit'] is None:
+                sizes = [len(self.solver.all_permutations) if stage.kind == Stage.FREE else len(stage.perms)
+                         for stage in stages]
+                self._count_stages(sizes, [solution.choices for solution in result])
+            return info
+        if name == 'match_options':
+            option_lists = arguments['option_lists']
+            self._count_stages([len(options) for options in option_lists], result)
+            return {'stages': len(option_lists), 'solutions': len(result)}
+        return {}
+
+    def _count_stages(self, sizes: List[int], chosen: Sequence[Sequence[int]]) -> None:
+        """由全部解累计各级的候选数和被排除数(没有出现在任何解中的候选)"""
+        for index, size in enumerate(sizes):
+            counts = self.stages.setdefault(index, Counter())
+            counts['examined'] += size
+            counts['pruned'] += size - len({choices[index] for choices in chosen})
+
+    def _record(self, phase: str, elapsed: float, info: dict) -> None:
+        entry = self.phases.get(phase)
+        if entry is None:
+            entry = self.phases[phase] = [0, 0.0]
+        entry[0] += 1
+        entry[1] += elapsed
+        for hook in self.hooks:
+            hook('phase', phase, elapsed, info)
+
+    def snapshot(self) -> dict:
+        """可直接序列化为JSON的统计"""
+        counters = self.counters.copy()
+        counters['apply_permutation'] += self._applications()
+        stats = {
+            'counters': dict(counters),
+            'phases': {name: {'calls': calls, 'total_ms': round(total * 1000, 3),
+                              'mean_us': round(total / calls * 1e6, 2) if calls else 0.0}
+                       for name, (calls, total) in sorted(self.phases.items(), key=lambda item: -item[1][1])},
+            'stages': {index: dict(counts) for index, counts in sorted(self.stages.items())},
+        }
+        cache = self.solver.cache
+        if cache is not None and self._cache_base is not None:
+            hits, misses = cache.hits - self._cache_base[0], cache.misses - self._cache_base[1]
+            stats['cache'] = {'hits': hits, 'misses': misses,
+                              'hit_rate': hits / (hits + misses) if hits + misses else 0.0}
+        return stats
+
+
+class CsvTrace:
+    """把每次阶段调用写成一行CSV: 时间戳, 事件, 阶段, 耗时(微秒), 附加信息(JSON)"""
+
+    def __init__(self, target):
+        self._own = isinstance(target, str)
+        self.stream: IO[str] = open(target, 'w', newline='', encoding='utf-8') if self._own else target
+        self.writer = csv.writer(self.stream)
+        self.writer.writerow(['time', 'event', 'phase', 'elapsed_us', 'info'])
+
+    def __call__(self, event: str, phase: str, elapsed: float, info: dict) -> None:
+        self.writer.writerow([f'{time.time():.6f}', event, phase, f'{elapsed * 1e6:.2f}',
+                              json.dumps(info, ensure_ascii=False)])
+
+    def close(self) -> None:
+        if self._own:
+            self.stream.close()
+        else:
+            self.stream.flush()
+
+
+@contextmanager
+def profile_session(solver, mode: str, output: Optional[str] = None, top: int = 30) -> Iterator[None]:
+    """--profile 的实现：在with块内按mode观测求解器，结束时把报告写到output(默认标准错误)
+
+    stats       计数与分阶段耗时(JSON)
+    trace       每次阶段调用一行CSV
+    cprofile    cProfile按累计时间排序的前top个函数
+    tracemalloc 内存分配最多的前top处代码
+    """
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"未知的分析模式: {mode}")
+    stream = sys.stderr if output is None else open(output, 'w', newline='', encoding='utf-8')
+    try:
+        if mode == 'stats':
+            with Instrumentation(solver) as probe:
+                yield
+            json.dump(probe.snapshot(), stream, ensure_ascii=False, indent=2)
+            stream.write('\n')
+        elif mode == 'trace':
+            trace = CsvTrace(stream)
+            with Instrumentation(solver, hooks=[trace]):
+                yield
+            trace.close()
+        elif mode == 'cprofile':
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+            text = io.StringIO()
+            pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(top)
+            stream.write(text.getvalue())
+        else:
+            tracemalloc.start()
+            try:
+                yield
+                snapshot = tracemalloc.take_snapshot()
+                current, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            stream.write(f"当前 {current / 1024:.1f} KiB，峰值 {peak / 1024:.1f} KiB\n")
+            for stat in snapshot.statistics('lineno')[:top]:
+                stream.write(f"{stat}\n")
+    finally:
+        if stream is not sys.stderr:
+            stream.close()
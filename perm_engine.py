@@ -0,0 +1,844 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""排列引擎：把排列和序列编码成整数，变换与复合都通过预计算表查表完成"""
+
+import itertools
+from collections import Counter, OrderedDict, defaultdict
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+# 序列长度不超过该值时预先构建完整的复合表、作用表；更长的序列按需计算
+EAGER_TABLE_MAX_N = 4
+MAX_N = 8
+
+
+class LazyRow(dict):
+    """按需计算并缓存的表格行，用法与列表行相同"""
+
+    __slots__ = ('_fill',)
+
+    def __init__(self, fill):
+        super().__init__()
+        self._fill = fill
+
+    def __missing__(self, key):
+        value = self[key] = self._fill(key)
+        return value
+
+
+class _CountedRow:
+    """开启计数时代替作用表的一行：每次查表记一次排列应用"""
+
+    __slots__ = ('_row', '_engine')
+
+    def __init__(self, row, engine: 'PermutationEngine'):
+        self._row = row
+        self._engine = engine
+
+    def __getitem__(self, code: int) -> int:
+        self._engine.applications += 1
+        return self._row[code]
+
+    def __iter__(self):
+        return iter(self._row)
+
+    def __len__(self):
+        return len(self._row)
+
+
+class PermutationEngine:
+    """n位排列的整数编码引擎
+
+    排列按 itertools.permutations 的顺序编号(编号0为恒等变换)，
+    长度为n、取值0..n-1的序列按n进制编码为整数。
+    compose[p][q] 表示先做p再做q，action[p][code] 表示序列code经过p后的编码。
+    n较大时表格按行惰性填充，访问方式不变。
+    """
+
+    def __init__(self, n: int = 4):
+        if not 1 <= n <= MAX_N:
+            raise ValueError(f"不支持的序列长度: {n}")
+        self.n = n
+        self.perms: List[Tuple[int, ...]] = list(itertools.permutations(range(n)))
+        self.perm_strings: List[str] = [''.join(str(i + 1) for i in p) for p in self.perms]
+        self.index: Dict[str, int] = {s: i for i, s in enumerate(self.perm_strings)}
+        self.identity = 0
+        self.size = n ** n
+        self._perm_ids = {p: i for i, p in enumerate(self.perms)}
+        self._orbits: Dict[int, frozenset] = {}
+        # 重复形状的分布模式 -> 稳定子群(保持该模式不变的排列编号)
+        self._stabilizers: Dict[Tuple[int, ...], Tuple[int, ...]] = {}
+        # 重复形状的分布模式 -> (输出等价类, 每个排列所属的类)
+        self._classes: Dict[Tuple[int, ...], Tuple[Tuple[Tuple[int, ...], ...], Tuple[int, ...]]] = {}
+
+        inverse = [0] * n
+        self.inverse: List[int] = []
+        for p in self.perms:
+            for i, j in enumerate(p):
+                inverse[j] = i
+            self.inverse.append(self._perm_ids[tuple(inverse)])
+
+        self.eager = n <= EAGER_TABLE_MAX_N
+        if self.eager:
+            self.compose = [[self._compose_ids(p, q) for q in range(len(self.perms))]
+                            for p in range(len(self.perms))]
+            self._digits = [self.decode(code) for code in range(self.size)]
+            self.action = [self._build_action_row(p) for p in self.perms]
+
+            # fibres[src][dst]: 所有把src变为dst的排列编号(升序)
+            fibres: List[Dict[int, List[int]]] = [{} for _ in range(self.size)]
+            for perm_id, row in enumerate(self.action):
+                for src, dst in enumerate(row):
+                    fibres[src].setdefault(dst, []).append(perm_id)
+            self._fibres: Optional[List[Dict[int, Tuple[int, ...]]]] = [
+                {dst: tuple(ids) for dst, ids in table.items()} for table in fibres
+            ]
+            # masks[src][dst]: 同一集合的位掩码，多组样例之间只需按位与
+            self._masks: Optional[List[Dict[int, int]]] = [
+                {dst: self.ids_to_mask(ids) for dst, ids in table.items()} for table in fibres
+            ]
+        else:
+            self.compose = [LazyRow(lambda q, p=p: self._compose_ids(p, q))
+                            for p in range(len(self.perms))]
+            self.action = [LazyRow(lambda code, p=p: self.encode([self.decode(code)[j] for j in p]))
+                           for p in self.perms]
+            self._fibres = None
+            self._masks = None
+        self.full_mask = (1 << len(self.perms)) - 1
+        # 排列应用次数，只在 count_applications 开启期间累加
+        self.applications = 0
+        self._counting = 0
+        self._plain_action = self.action
+        if self.eager:
+            # 形状数较少时所有模式一次算好(4个形状只有15种)
+            for code in range(self.size):
+                self.stabilizer(code)
+
+    @property
+    def counting(self) -> bool:
+        return self._counting > 0
+
+    @property
+    def plain_action(self) -> list:
+        """不计数的原始作用表，供需要长期持有行的调用方使用"""
+        return self._plain_action
+
+    def count_applications(self, enabled: bool) -> None:
+        """开启或关闭排列应用计数(可嵌套)
+
+        开启时作用表的每一行换成计数的代理，关闭后换回原表，不开启时查表没有额外开销。
+        """
+        if enabled:
+            if not self._counting:
+                self.action = [_CountedRow(row, self) for row in self._plain_action]
+            self._counting += 1
+        elif self._counting:
+            self._counting -= 1
+            if not self._counting:
+                self.action = self._plain_action
+
+    def _compose_ids(self, p: int, q: int) -> int:
+        # 先p后q: 新位置i的元素来自原位置 p[q[i]]
+        first = self.perms[p]
+        return self._perm_ids[tuple(first[j] for j in self.perms[q])]
+
+    def encode(self, symbols: Sequence[int]) -> int:
+        """把取值0..n-1的序列编码为整数"""
+        code = 0
+        for s in symbols:
+            code = code * self.n + s
+        return code
+
+    def decode(self, code: int) -> Tuple[int, ...]:
+        """把整数编码还原为序列"""
+        symbols = [0] * self.n
+        for i in range(self.n - 1, -1, -1):
+            code, symbols[i] = divmod(code, self.n)
+        return tuple(symbols)
+
+    def _build_action_row(self, perm: Sequence[int]) -> List[int]:
+        encode = self.encode
+        return [encode([digits[j] for j in perm]) for digits in self._digits]
+
+    def perm_id(self, perm_str: str) -> Optional[int]:
+        """排列字符串(如"2314")对应的编号，不是合法排列时返回None"""
+        return self.index.get(perm_str)
+
+    def orbit(self, code: int) -> frozenset:
+        """序列的所有重排(任意一次变换能到达的全部序列)"""
+        orbit = self._orbits.get(code)
+        if orbit is None:
+            encode = self.encode
+            orbit = frozenset(encode(p) for p in set(itertools.permutations(self.decode(code))))
+            for member in orbit:
+                self._orbits[member] = orbit
+        return orbit
+
+    def pattern(self, code: int) -> Tuple[int, ...]:
+        """序列中重复形状的分布模式：按首次出现重新编号，例如1123与3321均为(0, 0, 1, 2)"""
+        labels: Dict[int, int] = {}
+        return tuple(labels.setdefault(s, len(labels)) for s in self.decode(code))
+
+    def stabilizer(self, code: int) -> Tuple[int, ...]:
+        """保持序列不变的全部排列编号(升序)，即同种形状的位置之间任意对调
+
+        稳定子群只取决于重复形状的分布模式，每种模式只计算一次。
+        """
+        pattern = self.pattern(code)
+        ids = self._stabilizers.get(pattern)
+        if ids is None:
+            classes: Dict[int, List[int]] = {}
+            for i, label in enumerate(pattern):
+                classes.setdefault(label, []).append(i)
+            perm = [0] * self.n
+            found = []
+            for assignment in itertools.product(*(itertools.permutations(group) for group in classes.values())):
+                for group, origins in zip(classes.values(), assignment):
+                    for new_pos, old_pos in zip(group, origins):
+                        perm[new_pos] = old_pos
+                found.append(self._perm_ids[tuple(perm)])
+            ids = self._stabilizers[pattern] = tuple(sorted(found))
+        return ids
+
+    def output_classes(self, code: int) -> Tuple[Tuple[Tuple[int, ...], ...], Tuple[int, ...]]:
+        """按作用在序列code上的输出把全部排列分组，返回 (各组编号, 每个排列所属的组)
+
+        同一组的排列输出相同，即稳定子群的一个陪集；组按最小编号排序，第0组含恒等变换。
+        分组只取决于重复形状的分布模式，每种模式只计算一次。
+        """
+        pattern = self.pattern(code)
+        classes = self._classes.get(pattern)
+        if classes is None:
+            stabilizer = self.stabilizer(code)
+            compose = self.compose
+            class_of = [-1] * len(self.perms)
+            groups = []
+            for perm_id in range(len(self.perms)):
+                if class_of[perm_id] < 0:
+                    group = tuple(sorted(compose[s][perm_id] for s in stabilizer))
+                    for member in group:
+                        class_of[member] = len(groups)
+                    groups.append(group)
+            classes = self._classes[pattern] = (tuple(groups), tuple(class_of))
+        return classes
+
+    def relative(self, src: int, dst: int) -> Tuple[int, ...]:
+        """把序列src变为dst的所有排列编号
+
+        src中没有重复形状时解唯一；有重复形状时全部解构成一个陪集:
+        任取一个解r，先做src的稳定子群中任一排列再做r，都把src变为dst。
+        dst不是src的重排时返回空元组。
+        """
+        if self._fibres is not None:
+            return self._fibres[src].get(dst, ())
+
+        source, target = self.decode(src), self.decode(dst)
+        if sorted(source) != sorted(target):
+            return ()
+        # 代表元：每个目标位置依次取同种形状中尚未使用的来源位置
+        origins: Dict[int, List[int]] = {}
+        for i in range(self.n - 1, -1, -1):
+            origins.setdefault(source[i], []).append(i)
+        representative = self._perm_ids[tuple(origins[t].pop() for t in target)]
+        compose = self.compose
+        return tuple(sorted(compose[s][representative] for s in self.stabilizer(src)))
+
+    def pair_mask(self, src: int, dst: int) -> int:
+        """把src变为dst的所有排列，以位掩码表示(第i位对应编号i)"""
+        if self._masks is not None:
+            return self._masks[src].get(dst, 0)
+        return self.ids_to_mask(self.relative(src, dst))
+
+    @staticmethod
+    def ids_to_mask(ids: Iterable[int]) -> int:
+        """排列编号集合转为位掩码"""
+        mask = 0
+        for perm_id in ids:
+            mask |= 1 << perm_id
+        return mask
+
+    @staticmethod
+    def mask_to_ids(mask: int) -> List[int]:
+        """位掩码转为升序的排列编号列表"""
+        ids = []
+        while mask:
+            low = mask & -mask
+            ids.append(low.bit_length() - 1)
+            mask ^= low
+        return ids
+
+    def solve_stage(self, src: int, dst: int, prefix: int = 0, suffix: int = 0) -> int:
+        """直接求出未知变换(位掩码): src依次经过prefix、未知变换、suffix后得到dst
+
+        prefix/suffix为未知变换前后固定变换复合后的编号，
+        把dst用suffix的逆变换拉回后即可化为一次pair_mask查表。
+        """
+        start = self.action[prefix][src]
+        end = self.action[self.inverse[suffix]][dst]
+        return self.pair_mask(start, end)
+
+
+@lru_cache(maxsize=None)
+def get_engine(n: int = 4) -> PermutationEngine:
+    """获取n位排列引擎(每个进程只构建一次)"""
+    return PermutationEngine(n)
+
+
+class Stage:
+    """管道中的一级变换：固定(fixed)、任意(free)或限定在选项列表中(options)"""
+
+    FIXED = 'fixed'
+    FREE = 'free'
+    OPTIONS = 'options'
+
+    __slots__ = ('kind', 'perms')
+
+    def __init__(self, kind: str, perms: Sequence[str] = ()):
+        if kind not in (self.FIXED, self.FREE, self.OPTIONS):
+            raise ValueError(f"未知的变换类型: {kind}")
+        self.kind = kind
+        self.perms = tuple(perms)
+
+    @classmethod
+    def fixed(cls, perm: str) -> 'Stage':
+        return cls(cls.FIXED, (perm,))
+
+    @classmethod
+    def free(cls) -> 'Stage':
+        return cls(cls.FREE)
+
+    @classmethod
+    def options(cls, perms: Sequence[str]) -> 'Stage':
+        return cls(cls.OPTIONS, perms)
+
+    @classmethod
+    def coerce(cls, spec: Union['Stage', str, Sequence[str], None]) -> 'Stage':
+        """简写: 字符串为固定变换，None为任意变换，列表为选项"""
+        if isinstance(spec, Stage):
+            return spec
+        if spec is None:
+            return cls.free()
+        if isinstance(spec, str):
+            return cls.fixed(spec)
+        return cls.options(spec)
+
+    def key(self) -> tuple:
+        """可哈希的键，用于缓存编译结果"""
+        return self.kind, self.perms
+
+    def __repr__(self):
+        return f"Stage({self.kind!r}, {list(self.perms)!r})"
+
+
+class PipelineSolution(NamedTuple):
+    """一组可行解: choices为每级在候选中的下标(任意变换时即排列编号)，perms为对应排列"""
+    choices: Tuple[int, ...]
+    perms: Tuple[str, ...]
+
+
+StageSpec = Union[Stage, str, Sequence[str], None]
+
+
+def _stage_ids(engine: PermutationEngine, stage: Stage) -> Optional[List[int]]:
+    """把一级变换转换为排列编号列表，任意变换返回None"""
+    if stage.kind == Stage.FREE:
+        return None
+    ids = []
+    for perm in stage.perms:
+        perm_id = engine.index.get(perm)
+        if perm_id is None:
+            raise ValueError(f"不是合法的{engine.n}位排列: {perm}")
+        ids.append(perm_id)
+    return ids
+
+
+def canonical_pair(engine: PermutationEngine, input_seq: Sequence, output_seq: Sequence) -> Optional[Tuple[int, int]]:
+    """规范化一组样例：按输入中出现的顺序给形状重新编号，再把输入输出编码为整数
+
+    答案只取决于输入到输出的相对排列，与具体是哪些形状无关，
+    因此规范化后的编码可以直接作为缓存键。无法编码(长度或形状不符)时返回None。
+    """
+    symbols: Dict = {}
+    for shape in input_seq:
+        symbols.setdefault(shape, len(symbols))
+    if len(output_seq) != len(input_seq) or any(shape not in symbols for shape in output_seq):
+        return None
+    return (engine.encode([symbols[s] for s in input_seq]),
+            engine.encode([symbols[s] for s in output_seq]))
+
+
+class LRUCache:
+    """有容量上限的LRU缓存，记录命中与未命中次数"""
+
+    MISSING = object()
+
+    def __init__(self, maxsize: int = 4096):
+        if maxsize < 1:
+            raise ValueError("缓存容量必须为正数")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: 'OrderedDict' = OrderedDict()
+
+    def get(self, key):
+        """查找缓存，未命中时返回 LRUCache.MISSING"""
+        value = self._data.get(key, self.MISSING)
+        if value is self.MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._data.move_to_end(key)
+        return value
+
+    def put(self, key, value) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+class _SearchSpace:
+    """搜索状态：单组样例时状态为序列编码，多组样例时为各组编码组成的元组"""
+
+    def __init__(self, engine: PermutationEngine, pairs: List[Tuple[int, int]]):
+        self.engine = engine
+        self.multi = len(pairs) > 1
+        if self.multi:
+            self.src = tuple(src for src, _ in pairs)
+            self.dst = tuple(dst for _, dst in pairs)
+        else:
+            self.src, self.dst = pairs[0]
+
+    def step(self, perm_id: int, state):
+        row = self.engine.action[perm_id]
+        if self.multi:
+            return tuple(row[x] for x in state)
+        return row[state]
+
+    def expand(self, states: set, ids: Optional[List[int]], backward: bool) -> set:
+        """一级变换能到达的全部状态；反向时使用逆变换求原像"""
+        engine = self.engine
+        if not states:
+            return set()
+        if ids is None:
+            if not self.multi:
+                # 任意变换：到达整条轨道
+                return set(engine.orbit(next(iter(states))))
+            ids = range(len(engine.perms))
+        rows = [engine.action[engine.inverse[p]] if backward else engine.action[p] for p in ids]
+        if self.multi:
+            return {tuple(row[x] for x in state) for row in rows for state in states}
+        return {row[x] for row in rows for x in states}
+
+    def link_mask(self, state, target) -> int:
+        """把state变为target的所有排列(位掩码)，多组样例时逐组按位与"""
+        engine = self.engine
+        if not self.multi:
+            return engine.pair_mask(state, target)
+        mask = engine.full_mask
+        for x, y in zip(state, target):
+            mask &= engine.pair_mask(x, y)
+            if not mask:
+                break
+        return mask
+
+
+def _iter_meet_in_the_middle(space: _SearchSpace, plan: List[Optional[List[int]]]) -> Iterator[Tuple[int, ...]]:
+    """双向搜索：从输入正向、从目标反向各展开一半，在中间层求交后按字典序枚举解"""
+    k = len(plan)
+    if k == 0:
+        if space.src == space.dst:
+            yield ()
+        return
+
+    mid = (k + 1) // 2
+    forward = {space.src}
+    for stage in range(mid):
+        forward = space.expand(forward, plan[stage], backward=False)
+    # goals[i]: 第i层中能到达目标的状态
+    goals: List[Optional[set]] = [None] * (k + 1)
+    goals[k] = {space.dst}
+    for stage in range(k - 1, mid - 1, -1):
+        goals[stage] = space.expand(goals[stage + 1], plan[stage], backward=True)
+    goals[mid] = goals[mid] & forward
+    if not goals[mid]:
+        return
+
+    engine = space.engine
+    step = space.step
+
+    def children(stage: int, state):
+        ids = plan[stage]
+        if ids is not None:
+            for choice, perm_id in enumerate(ids):
+                yield choice, step(perm_id, state)
+        elif stage + 1 >= mid:
+            # 任意变换且下一层目标已知：直接反解出所有可行排列
+            mask = 0
+            for target in goals[stage + 1]:
+                mask |= space.link_mask(state, target)
+            for perm_id in engine.mask_to_ids(mask):
+                yield perm_id, step(perm_id, state)
+        else:
+            for perm_id in range(len(engine.perms)):
+                yield perm_id, step(perm_id, state)
+
+    yield from walk_paths(space.src, k, mid, goals, children)
+
+
+def walk_paths(src, k: int, mid: int, goals: List[Optional[set]],
+               children: Callable[[int, object], Iterable[Tuple[int, object]]]) -> Iterator[Tuple[int, ...]]:
+    """从src出发按字典序枚举能到达目标的各级选择，只走仍能到达目标的分支
+
+    children(stage, state)依次给出 (选择, 下一状态)；goals[i](i >= mid)为第i层中能到达目标的状态，
+    前半段的可达性按需计算并缓存。两处都用显式栈代替递归，级数很多时也不会超出递归深度。
+    """
+    alive_cache: List[Dict] = [{} for _ in range(mid)]
+
+    def alive(layer: int, state) -> bool:
+        if layer >= mid:
+            return state in goals[layer]
+        result = alive_cache[layer].get(state)
+        if result is not None:
+            return result
+        stack = [(layer, state, iter(children(layer, state)))]
+        result = False
+        while stack:
+            layer, state, pending = stack[-1]
+            if not result:
+                for _, nxt in pending:
+                    if layer + 1 >= mid:
+                        result = nxt in goals[layer + 1]
+                    else:
+                        result = alive_cache[layer + 1].get(nxt)
+                        if result is None:
+                            # 下一层尚未求过，先求它再回到这里继续
+                            result = False
+                            stack.append((layer + 1, nxt, iter(children(layer + 1, nxt))))
+                            break
+                    if result:
+                        break
+                if stack[-1][2] is not pending:
+                    continue
+            alive_cache[layer][state] = result
+            stack.pop()
+        return result
+
+    if k == 0:
+        yield ()
+        return
+    chosen: List[int] = []
+    stack = [iter(children(0, src))]
+    while stack:
+        stage = len(stack) - 1
+        for choice, nxt in stack[-1]:
+            if alive(stage + 1, nxt):
+                break
+        else:
+            stack.pop()
+            if chosen:
+                chosen.pop()
+            continue
+        if stage + 1 == k:
+            yield tuple(chosen) + (choice,)
+        else:
+            chosen.append(choice)
+            stack.append(iter(children(stage + 1, nxt)))
+
+
+def _iter_brute_force(space: _SearchSpace, plan: List[Optional[List[int]]]) -> Iterator[Tuple[int, ...]]:
+    """对照实现：逐个枚举所有组合"""
+    all_ids = list(range(len(space.engine.perms)))
+    stage_ids = [all_ids if ids is None else ids for ids in plan]
+    for choices in itertools.product(*(range(len(ids)) for ids in stage_ids)):
+        state = space.src
+        for ids, choice in zip(stage_ids, choices):
+            state = space.step(ids[choice], state)
+        if state == space.dst:
+            yield choices
+
+
+def _join_options(space: _SearchSpace, plan: List[Optional[List[int]]]) -> List[Tuple[int, ...]]:
+    """哈希连接：正向展开前一半、反向展开后一半，按中间状态连接，返回全部解(字典序)
+
+    每一层按状态分组记录到达它的选择，相同排列的选项只计算一次，
+    两级管道时代价与选项数成线性关系，而不是选项数的乘积。
+    """
+    engine = space.engine
+    k = len(plan)
+    mid = (k + 1) // 2
+
+    def grouped(ids: Optional[List[int]]) -> Dict[int, List[int]]:
+        groups: Dict[int, List[int]] = defaultdict(list)
+        for choice, perm_id in enumerate(range(len(engine.perms)) if ids is None else ids):
+            groups[perm_id].append(choice)
+        return groups
+
+    forward: Dict = {space.src: [()]}
+    for stage in range(mid):
+        layer: Dict = defaultdict(list)
+        for perm_id, choices in grouped(plan[stage]).items():
+            for state, prefixes in forward.items():
+                layer[space.step(perm_id, state)].extend(
+                    prefix + (choice,) for prefix in prefixes for choice in choices)
+        forward = layer
+    backward: Dict = {space.dst: [()]}
+    for stage in range(k - 1, mid - 1, -1):
+        layer = defaultdict(list)
+        for perm_id, choices in grouped(plan[stage]).items():
+            inverse = engine.inverse[perm_id]
+            for state, suffixes in backward.items():
+                layer[space.step(inverse, state)].extend(
+                    (choice,) + suffix for choice in choices for suffix in suffixes)
+        backward = layer
+
+    matches = [prefix + suffix for state in forward.keys() & backward.keys()
+               for prefix in forward[state] for suffix in backward[state]]
+    matches.sort()
+    return matches
+
+
+def _count_paths(space: _SearchSpace, plan: List[Optional[List[int]]]) -> int:
+    """只计数不枚举：两端各展开一半，每层记录到达各状态的组合数，在中间层相乘求和"""
+    engine = space.engine
+    k = len(plan)
+    mid = (k + 1) // 2
+
+    def layer(states: Dict, stage: int, backward: bool) -> Dict:
+        ids = plan[stage]
+        counts: Dict = defaultdict(int)
+        for perm_id, multiplicity in Counter(range(len(engine.perms)) if ids is None else ids).items():
+            if backward:
+                perm_id = engine.inverse[perm_id]
+            for state, count in states.items():
+                counts[space.step(perm_id, state)] += count * multiplicity
+        return counts
+
+    forward: Dict = {space.src: 1}
+    for stage in range(mid):
+        forward = layer(forward, stage, backward=False)
+    backward: Dict = {space.dst: 1}
+    for stage in range(k - 1, mid - 1, -1):
+        backward = layer(backward, stage, backward=True)
+    return sum(count * backward.get(state, 0) for state, count in forward.items())
+
+
+class CompiledPipeline:
+    """编译后的管道：相邻的固定变换预先复合为一个排列
+
+    stages/plan为原始各级及其排列编号(任意变换为None)；compiled为折叠后的各级编号，
+    groups[i]为折叠后第i级对应的原始各级下标。只有一级需要选择时，
+    prefix/suffix为其前后固定变换的复合，求解只需对每组样例做一次查表。
+    """
+
+    __slots__ = ('engine', 'stages', 'plan', 'compiled', 'groups', 'variable', 'prefix', 'suffix')
+
+    def __init__(self, engine: PermutationEngine, stages: Sequence[Stage]):
+        self.engine = engine
+        self.stages = list(stages)
+        self.plan = [_stage_ids(engine, stage) for stage in self.stages]
+        compiled: List[Optional[List[int]]] = []
+        groups: List[List[int]] = []
+        fixed: List[bool] = []
+        for index, (stage, ids) in enumerate(zip(self.stages, self.plan)):
+            if stage.kind == Stage.FIXED and fixed and fixed[-1]:
+                compiled[-1] = [engine.compose[compiled[-1][0]][ids[0]]]
+                groups[-1].append(index)
+            else:
+                compiled.append(ids)
+                groups.append([index])
+                fixed.append(stage.kind == Stage.FIXED)
+        self.compiled = compiled
+        self.groups = groups
+
+        variables = [i for i, is_fixed in enumerate(fixed) if not is_fixed]
+        self.variable = variables[0] if len(variables) == 1 else None
+        self.prefix = self.suffix = engine.identity
+        if self.variable is not None:
+            if self.variable > 0:
+                self.prefix = compiled[0][0]
+            if self.variable < len(compiled) - 1:
+                self.suffix = compiled[-1][0]
+
+    def search(self, space: '_SearchSpace') -> Iterator[Tuple[int, ...]]:
+        """按字典序给出原始各级的选择"""
+        if self.variable is None:
+            choices = _iter_meet_in_the_middle(space, self.compiled)
+        else:
+            choices = self._solve_variable(space)
+        groups = self.groups
+        for compiled_choices in choices:
+            original = []
+            for group, choice in zip(groups, compiled_choices):
+                original.extend([choice] if len(group) == 1 else [0] * len(group))
+            yield tuple(original)
+
+    def _solve_variable(self, space: '_SearchSpace') -> Iterator[Tuple[int, ...]]:
+        # 每组样例各做一次solve_stage，可行排列为各组结果的交集
+        engine = self.engine
+        prefix, suffix = self.prefix, self.suffix
+        pairs = zip(space.src, space.dst) if space.multi else [(space.src, space.dst)]
+        mask = engine.full_mask
+        for src, dst in pairs:
+            mask &= engine.solve_stage(src, dst, prefix, suffix)
+            if not mask:
+                return
+        ids = self.compiled[self.variable]
+        if ids is None:
+            variable_choices = engine.mask_to_ids(mask)
+        else:
+            variable_choices = [choice for choice, perm_id in enumerate(ids) if mask >> perm_id & 1]
+        fixed_choice = [0] * len(self.compiled)
+        for choice in variable_choices:
+            fixed_choice[self.variable] = choice
+            yield tuple(fixed_choice)
+
+
+@lru_cache(maxsize=1024)
+def _compile_cached(n: int, keys: Tuple[tuple, ...]) -> CompiledPipeline:
+    return CompiledPipeline(get_engine(n), [Stage(kind, perms) for kind, perms in keys])
+
+
+def compile_pipeline(n: int, stages: Sequence[StageSpec]) -> CompiledPipeline:
+    """编译n位管道；固定变换相同的题目共用同一份编译结果"""
+    stages = [Stage.coerce(stage) for stage in stages]
+    try:
+        return _compile_cached(n, tuple(stage.key() for stage in stages))
+    except TypeError:  # 选项中含有不可哈希的值，不缓存
+        return CompiledPipeline(get_engine(n), stages)
+
+
+def clear_caches() -> None:
+    """清空进程内的排列表和管道编译缓存(基准测试的冷启动用)"""
+    get_engine.cache_clear()
+    _compile_cached.cache_clear()
+
+
+def prepare_pipeline(input_seq: Sequence, output_seq: Sequence, stages: Sequence[StageSpec],
+                     examples: Sequence[Tuple[Sequence, Sequence]]):
+    """统一处理参数：返回 (编译后的管道, 搜索空间)，样例无法编码时搜索空间为None"""
+    pipeline = compile_pipeline(len(input_seq), stages)
+    engine = pipeline.engine
+    pairs = []
+    for example_input, example_output in [(input_seq, output_seq)] + list(examples):
+        codes = canonical_pair(engine, example_input, example_output) if len(example_input) == engine.n else None
+        if codes is None:
+            return pipeline, None
+        pairs.append(codes)
+    return pipeline, _SearchSpace(engine, pairs)
+
+
+def iter_pipeline_solutions(input_seq: Sequence, output_seq: Sequence, stages: Sequence[StageSpec],
+                            brute_force: bool = False,
+                            examples: Sequence[Tuple[Sequence, Sequence]] = ()) -> Iterator[PipelineSolution]:
+    """按字典序逐个给出管道的可行解
+
+    input_seq/output_seq 可以是 "12345" 这样的字符串或任意形状列表，序列长度即排列位数；
+    stages 中每一级可以是 Stage，或简写(字符串/None/列表，见 Stage.coerce)；
+    examples 为额外的 (输入, 输出) 样例，解需要同时满足所有样例。
+    """
+    pipeline, space = prepare_pipeline(input_seq, output_seq, stages, examples)
+    if space is None:
+        return
+
+    stages, plan = pipeline.stages, pipeline.plan
+    # 对照实现按原始各级逐个枚举，默认在编译后的管道上搜索
+    search = _iter_brute_force(space, plan) if brute_force else pipeline.search(space)
+    perm_strings = space.engine.perm_strings
+    for choices in search:
+        perms = tuple(perm_strings[choice] if ids is None else stage.perms[choice]
+                      for stage, ids, choice in zip(stages, plan, choices))
+        yield PipelineSolution(choices, perms)
+
+
+def solve_pipeline(input_seq: Sequence, output_seq: Sequence, stages: Sequence[StageSpec],
+                   limit: Optional[int] = None, brute_force: bool = False,
+                   examples: Sequence[Tuple[Sequence, Sequence]] = ()) -> List[PipelineSolution]:
+    """求解任意位数、任意级数的管道，返回至多limit组解(按字典序)"""
+    solutions = iter_pipeline_solutions(input_seq, output_seq, stages, brute_force=brute_force,
+                                        examples=examples)
+    return list(itertools.islice(solutions, limit))
+
+
+def count_pipeline_solutions(input_seq: Sequence, output_seq: Sequence, stages: Sequence[StageSpec],
+                             brute_force: bool = False,
+                             examples: Sequence[Tuple[Sequence, Sequence]] = ()) -> int:
+    """管道可行解的个数，不生成任何解(用于统计答案是否唯一)"""
+    pipeline, space = prepare_pipeline(input_seq, output_seq, stages, examples)
+    if space is None:
+        return 0
+    if brute_force:
+        return sum(1 for _ in _iter_brute_force(space, pipeline.plan))
+    return _count_paths(space, pipeline.compiled)
+
+
+def join_options(input_seq: Sequence, output_seq: Sequence, stages: Sequence[StageSpec],
+                 examples: Sequence[Tuple[Sequence, Sequence]] = ()) -> List[Tuple[int, ...]]:
+    """多条管道各自从选项中选一个变换，返回全部满足样例的选择(每级在候选中的下标，按字典序)"""
+    pipeline, space = prepare_pipeline(input_seq, output_seq, stages, examples)
+    if space is None:
+        return []
+    return _join_options(space, pipeline.plan)
+
+
+def stage_masks(input_seq: Sequence, output_seq: Sequence, stages: Sequence[StageSpec],
+                examples: Sequence[Tuple[Sequence, Sequence]] = ()) -> List[int]:
+    """每一级在全部可行解中可能取到的排列(位掩码)
+
+    每增加一组样例，只需对预计算的 (输入, 输出) 掩码多做一次按位与。
+    某一级的掩码多于一位即说明该级答案不唯一。
+    """
+    pipeline, space = prepare_pipeline(input_seq, output_seq, stages, examples)
+    if space is None:
+        return [0] * len(pipeline.stages)
+    plan = pipeline.plan
+
+    k = len(plan)
+    forward = [{space.src}]
+    for stage in range(k):
+        forward.append(space.expand(forward[-1], plan[stage], backward=False))
+    backward = [set() for _ in range(k)] + [{space.dst}]
+    for stage in range(k - 1, -1, -1):
+        backward[stage] = space.expand(backward[stage + 1], plan[stage], backward=True)
+    alive = [f & b for f, b in zip(forward, backward)]
+
+    masks = []
+    for stage, ids in enumerate(plan):
+        mask = 0
+        for state in alive[stage]:
+            if ids is None:
+                for target in alive[stage + 1]:
+                    mask |= space.link_mask(state, target)
+            else:
+                for perm_id in ids:
+                    if space.step(perm_id, state) in alive[stage + 1]:
+                        mask |= 1 << perm_id
+        masks.append(mask)
+    return masks
+
+
+def trace_pipeline(sequence: Sequence, perms: Sequence[str]) -> List[list]:
+    """依次应用各级排列，返回每一级之后的序列"""
+    path = []
+    current = list(sequence)
+    for perm in perms:
+        current = [current[int(c) - 1] for c in perm]
+        path.append(current)
+    return path
@@ -1,17 +1,110 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import argparse
+import contextlib
 import itertools
-from typing import List, Tuple, Optional
+import sys
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from answer_atlas import ATLAS_PATH, build_atlas, load_atlas, verify_atlas
+from distractors import DistractorGenerator
+from presenter import ConsolePresenter
+from session import SolveSession
+from transforms import is_transform_spec, solve_transforms
+from perm_engine import (LRUCache, PipelineSolution, Stage, canonical_pair, count_pipeline_solutions,
+                         get_engine, iter_pipeline_solutions, join_options, solve_pipeline, stage_masks,
+                         trace_pipeline)
+from vector_engine import HAVE_NUMPY, solve_pipeline as solve_pipeline_vectorized
+
+# 求解模式: 'algebraic' 代数直接求解未知变换, 'brute_force' 逐个枚举(仅作对照),
+# 'vectorized' 用NumPy一次比较整个候选网格(未安装NumPy时退回 'algebraic')
+SOLVE_MODES = ('algebraic', 'brute_force', 'vectorized')
+
+
+# 可用的形状，序列位数不超过形状数
+ALL_SHAPES = {
+    '1': '●',  # 圆形
+    '2': '▲',  # 三角形
+    '3': '■',  # 正方形
+    '4': '✚',  # 十字形
+    '5': '★',  # 五角星
+    '6': '◆'   # 菱形
+}
+
+
+def _copy_result(value):
+    """复制缓存中的结果(列表、元组、字典逐层复制)"""
+    if isinstance(value, list):
+        return [_copy_result(item) for item in value]
+    if isinstance(value, tuple):
+        return tuple(_copy_result(item) for item in value)
+    if isinstance(value, dict):
+        return {key: _copy_result(item) for key, item in value.items()}
+    return value
+
+
+def _freeze(value):
+    """把JSON值转为可哈希的形式，用作缓存键"""
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    return value
+
+
+class SolveResult:
+    """solve_q1 / solve_q2_q3 / solve_q4_q6 / solve_two_step_permutation 的求解结果，不含任何输出
+
+    answer为选项编号(从1开始；题型7为两步各自的编号)，无解时为None；
+    path为从输入开始、依次经过每一级变换后的序列；candidates为所有样例下仍然可行的选项编号。
+    展示由 presenter.ConsolePresenter 负责。
+    """
+
+    __slots__ = ('question_type', 'input_seq', 'target_seq', 'fixed', 'options', 'variable_position',
+                 'answer', 'path', 'candidates')
+
+    def __init__(self, question_type: str, input_seq: Optional[List[str]] = None,
+                 target_seq: Optional[List[str]] = None, fixed: Tuple[str, ...] = (), options=(),
+                 variable_position: int = 0, answer=None, path: Optional[List[List[str]]] = None,
+                 candidates: tuple = ()):
+        self.question_type = question_type
+        self.input_seq = input_seq
+        self.target_seq = target_seq
+        self.fixed = fixed
+        self.options = options
+        self.variable_position = variable_position
+        self.answer = answer
+        self.path = path
+        self.candidates = candidates
+
+    @property
+    def found(self) -> bool:
+        return self.answer is not None
+
+    @property
+    def choice(self):
+        """选中的排列(题型7为两步各自的排列)"""
+        if self.answer is None:
+            return None
+        if self.question_type == '7':
+            return tuple(options[i - 1] for options, i in zip(self.options, self.answer))
+        return self.options[self.answer - 1]
+
+    def __repr__(self):
+        return f"SolveResult(type={self.question_type!r}, answer={self.answer!r}, candidates={self.candidates!r})"
+
 
 class VisualReasoningSolver:
-    def __init__(self):
-        self.shapes = {
-            '1': '●',  # 圆形
-            '2': '▲',  # 三角形
-            '3': '■',  # 正方形
-            '4': '✚'   # 十字形
-        }
+    def __init__(self, solve_mode: str = 'algebraic', num_symbols: int = 4, cache_size: int = 4096,
+                 atlas_path: Optional[str] = ATLAS_PATH):
+        if solve_mode not in SOLVE_MODES:
+            raise ValueError(f"未知的求解模式: {solve_mode}")
+        if not 1 <= num_symbols <= len(ALL_SHAPES):
+            raise ValueError(f"形状数量需在1-{len(ALL_SHAPES)}之间: {num_symbols}")
+        self.solve_mode = solve_mode
+        
+        self.shapes = dict(itertools.islice(ALL_SHAPES.items(), num_symbols))
         
         # 题型定义
         self.question_types = {
@@ -24,14 +117,43 @@ class VisualReasoningSolver:
             '7': '双管道'
         }
         
+        # 排列与序列均编码为整数，求解过程只做查表
+        self.engine = get_engine(len(self.shapes))
         self.all_permutations = self._generate_all_permutations()
+        self.symbol_codes = {shape: i for i, shape in enumerate(self.shapes.values())}
+        self.code_symbols = list(self.shapes.values())
+        # 自动出题时排除恒等变换
+        self.non_identity = Stage.options(
+            [perm for perm_id, perm in enumerate(self.all_permutations) if perm_id != self.engine.identity])
+        # 以规范化样例为键的结果缓存，cache_size为0时关闭
+        self.cache = LRUCache(cache_size) if cache_size else None
+        # 自动/半自动推导选项时按输出等价类出干扰项
+        self.distractors = DistractorGenerator(self.engine)
+        # 预先生成的答案图谱(--build-atlas)，不存在时照常求解；对照模式不使用
+        self.atlas = None
+        if atlas_path is not None and solve_mode != 'brute_force':
+            self.atlas = load_atlas(self.engine, atlas_path)
         
     def _generate_all_permutations(self) -> List[str]:
-        """生成所有可能的4位排列变换"""
-        perms = []
-        for perm in itertools.permutations('1234'):
-            perms.append(''.join(perm))
-        return perms
+        """生成所有可能的n位排列变换"""
+        return list(self.engine.perm_strings)
+
+    def is_permutation(self, perm_str: str) -> bool:
+        """检查是否为合法的n位排列"""
+        return perm_str in self.engine.index
+
+    def encode_sequence(self, sequence: List[str]) -> Optional[int]:
+        """把形状序列编码为整数，无法编码时返回None"""
+        if len(sequence) != self.engine.n:
+            return None
+        symbols = [self.symbol_codes.get(shape) for shape in sequence]
+        if None in symbols:
+            return None
+        return self.engine.encode(symbols)
+
+    def decode_sequence(self, code: int) -> List[str]:
+        """把整数编码还原为形状序列"""
+        return [self.code_symbols[s] for s in self.engine.decode(code)]
 
     def display_menu(self):
         """显示主菜单"""
@@ -96,7 +218,7 @@ class VisualReasoningSolver:
 
     def get_input_output_sequences(self) -> Tuple[List[List[str]], List[List[str]]]:
         """获取输入和输出序列"""
-        print("\n请输入序列 (使用数字1-4代表形状: ●▲■✚)")
+        print(f"\n请输入序列 (使用数字1-{self.engine.n}代表形状: {''.join(self.shapes.values())})")
         print("多个序列用逗号分隔，例如: 1234,2341,3412")
         
         while True:
@@ -119,232 +241,262 @@ class VisualReasoningSolver:
         
         return input_sequences, output_sequences
 
+    def example_pairs(self, input_seqs: List[List[str]],
+                      output_seqs: List[List[str]]) -> List[Tuple[List[str], List[str]]]:
+        """按顺序配对所有输入输出序列，长度不符时返回空列表"""
+        pairs = list(zip(input_seqs, output_seqs))
+        if any(len(seq) != self.engine.n for pair in pairs for seq in pair):
+            return []
+        return pairs
+
+    def canonical_key(self, input_seqs: List[List[str]], output_seqs: List[List[str]]) -> Optional[tuple]:
+        """把全部样例规范化为与具体形状无关的键，无法规范化时返回None"""
+        pairs = self.example_pairs(input_seqs, output_seqs)
+        if not pairs:
+            return None
+        key = tuple(canonical_pair(self.engine, input_seq, output_seq) for input_seq, output_seq in pairs)
+        return None if None in key else key
+
+    def _memoize(self, tag: tuple, input_seqs: List[List[str]], output_seqs: List[List[str]], compute):
+        """按 (求解类型, 规范化样例) 缓存结果，返回副本以免调用方改动缓存内容"""
+        if self.cache is None:
+            return compute()
+        canonical = self.canonical_key(input_seqs, output_seqs)
+        if canonical is None:
+            return compute()
+        key = tag + (canonical,)
+        value = self.cache.get(key)
+        if value is LRUCache.MISSING:
+            value = compute()
+            self.cache.put(key, value)
+        return _copy_result(value)
+
+    def solve_stages(self, input_seqs: List[List[str]], output_seqs: List[List[str]],
+                     stages: List[Stage], limit: Optional[int] = None) -> List[PipelineSolution]:
+        """用全部输入输出样例求解管道，返回按字典序排列的可行解"""
+        pairs = self.example_pairs(input_seqs, output_seqs)
+        if not pairs:
+            return []
+        if self.solve_mode == 'vectorized' and HAVE_NUMPY:
+            solutions = solve_pipeline_vectorized(pairs[0][0], pairs[0][1], stages, limit=limit,
+                                                  examples=pairs[1:])
+            # 候选网格过大时改用代数求解
+            if solutions is not None:
+                return solutions
+        return solve_pipeline(pairs[0][0], pairs[0][1], stages, limit=limit,
+                              brute_force=self.solve_mode == 'brute_force', examples=pairs[1:])
+
+    def iter_stages(self, input_seqs: List[List[str]], output_seqs: List[List[str]],
+                    stages: List[Stage]) -> Iterator[PipelineSolution]:
+        """按字典序逐个给出可行解，取到需要的个数即可停止搜索"""
+        pairs = self.example_pairs(input_seqs, output_seqs)
+        if not pairs:
+            return iter(())
+        if self.solve_mode == 'vectorized' and HAVE_NUMPY:
+            solutions = solve_pipeline_vectorized(pairs[0][0], pairs[0][1], stages, examples=pairs[1:])
+            if solutions is not None:
+                return iter(solutions)
+        return iter_pipeline_solutions(pairs[0][0], pairs[0][1], stages,
+                                       brute_force=self.solve_mode == 'brute_force', examples=pairs[1:])
+
+    def count_stages(self, input_seqs: List[List[str]], output_seqs: List[List[str]],
+                     stages: List[Stage]) -> int:
+        """可行解的个数，不生成解本身"""
+        pairs = self.example_pairs(input_seqs, output_seqs)
+        if not pairs:
+            return 0
+        return count_pipeline_solutions(pairs[0][0], pairs[0][1], stages,
+                                        brute_force=self.solve_mode == 'brute_force', examples=pairs[1:])
+
+    def match_options(self, input_seqs: List[List[str]], output_seqs: List[List[str]],
+                      option_lists: List[List[str]]) -> List[Tuple[int, ...]]:
+        """多条管道各选一个变换：返回满足全部样例的所有选择(从0开始的下标，按字典序)"""
+        pairs = self.example_pairs(input_seqs, output_seqs)
+        if not pairs:
+            return []
+        stages = [Stage.options(options) for options in option_lists]
+        if self.solve_mode == 'brute_force':
+            return [solution.choices for solution in self.solve_stages(input_seqs, output_seqs, stages)]
+        return join_options(pairs[0][0], pairs[0][1], stages, examples=pairs[1:])
+
+    def stage_candidates(self, input_seqs: List[List[str]], output_seqs: List[List[str]],
+                         stages: List[Stage]) -> List[List[str]]:
+        """每一级在所有样例下仍然可行的排列，某一级多于一个即答案不唯一"""
+        pairs = self.example_pairs(input_seqs, output_seqs)
+        if not pairs:
+            return [[] for _ in stages]
+        masks = stage_masks(pairs[0][0], pairs[0][1], stages, examples=pairs[1:])
+        return [[self.all_permutations[perm_id] for perm_id in self.engine.mask_to_ids(mask)]
+                for mask in masks]
+
+    @staticmethod
+    def question_layout(question_type: str, fixed: Sequence[str], variable: Stage) -> Tuple[List[Stage], int]:
+        """题型1-6: 固定变换与唯一一级可选变换的排列顺序，返回 (各级变换, 可选级下标)
+
+        相同固定变换的题目得到相同的管道，编译结果(相邻固定变换的复合)会被复用。
+        """
+        stages = [Stage.fixed(perm) for perm in fixed]
+        if question_type in ['1', '3']:  # 只有一级，或第一次选择
+            variable_index = 0
+        elif question_type == '2':  # 第一次固定，第二次选择
+            variable_index = 1
+        else:  # Q4->1, Q5->2, Q6->3
+            variable_index = int(question_type) - 4
+        stages.insert(variable_index, variable)
+        return stages, variable_index
+
+    def _build_options(self, correct_option: str, states: Sequence[int]) -> List[str]:
+        """生成3个选项，包含正确答案(排第一)
+
+        states为可选那一级的输入(见 _variable_states)。干扰项取自其他输出等价类，
+        保证错误、两两输出不同且不是平凡变换；重复形状太多、等价类不够时选项少于3个。
+        """
+        correct_id = self.engine.perm_id(correct_option)
+        return [self.all_permutations[perm_id] for perm_id in self.distractors.options(states, correct_id, 3)]
+
+    def _variable_states(self, input_seqs: List[List[str]], output_seqs: List[List[str]],
+                         question_type: str, fixed: Sequence[str]) -> List[int]:
+        """可选那一级的输入：各组输入经过它前面的固定变换后的序列(按重复形状的模式编码)"""
+        stages, variable_index = self.question_layout(question_type, fixed, Stage.free())
+        prefix = [self.engine.perm_id(stage.perms[0]) for stage in stages[:variable_index]]
+        states = []
+        for seq, _ in self.example_pairs(input_seqs, output_seqs):
+            labels = {}
+            code = self.engine.encode([labels.setdefault(shape, len(labels)) for shape in seq])
+            for perm_id in prefix:
+                code = self.engine.action[perm_id][code]
+            states.append(code)
+        return states
+
+    def analyze_options(self, input_seqs: List[List[str]], output_seqs: List[List[str]],
+                        question_type: str, fixed: Sequence[str], options: Sequence[str]) -> dict:
+        """题型1-6: 检查一组选项，给出正确的、平凡的和输出相同无法区分的选项(编号从1开始)"""
+        stages, variable_index = self.question_layout(question_type, fixed, Stage.options(options))
+        pairs = self.example_pairs(input_seqs, output_seqs)
+        correct_mask = stage_masks(pairs[0][0], pairs[0][1], stages, examples=pairs[1:])[variable_index] if pairs else 0
+        states = self._variable_states(input_seqs, output_seqs, question_type, fixed)
+        return self.distractors.analyze(states, correct_mask, [self.engine.perm_id(perm) for perm in options])
+
+    def equivalent_choices(self, input_seqs: List[List[str]], output_seqs: List[List[str]],
+                           question_type: str, fixed: Sequence[str] = ()) -> List[str]:
+        """题型1-6: 给定固定变换时可选那一级的全部正确排列
+
+        输入有重复形状时正确排列不止一个，它们构成输入稳定子群的一个陪集，
+        由 (输入, 输出) 掩码按位与直接得到，不需要逐个枚举。
+        """
+        stages, variable_index = self.question_layout(question_type, fixed, Stage.free())
+        return self.stage_candidates(input_seqs, output_seqs, stages)[variable_index]
+
+    def _equivalents(self, input_seqs: List[List[str]], output_seqs: List[List[str]],
+                     question_type: str, fixed: Sequence[str]) -> List[str]:
+        """同 equivalent_choices，但输入没有重复形状时正确排列必然唯一，直接返回空列表"""
+        if all(len(set(seq)) == len(seq) for seq in input_seqs):
+            return []
+        return self.equivalent_choices(input_seqs, output_seqs, question_type, fixed)
+
     def auto_solve_q1(self, input_seqs: List[List[str]], output_seqs: List[List[str]]) -> Optional[List[str]]:
         """自动为Q1题型生成可能的变换选项"""
-        if not input_seqs or not output_seqs:
+        return self._memoize(('q1',), input_seqs, output_seqs,
+                             lambda: self._auto_solve_q1(input_seqs, output_seqs))
+
+    def _auto_solve_q1(self, input_seqs: List[List[str]], output_seqs: List[List[str]]) -> Optional[List[str]]:
+        """自动为Q1题型生成可能的变换选项(不经过缓存)"""
+        # 第一个正确变换作为答案；重复形状时其余正确变换不能再当干扰项
+        solutions = list(self.iter_auto_solutions(input_seqs, output_seqs, '1', limit=1))
+        if not solutions:
             return None
-            
-        input_seq = input_seqs[0]
-        target_seq = output_seqs[0]
-        
-        # 找到所有可能的变换
-        possible_transforms = []
-        for perm in self.all_permutations:
-            result = self.apply_permutation(input_seq, perm)
-            if result == target_seq:
-                possible_transforms.append(perm)
-        
-        if possible_transforms:
-            # 如果找到多个可能的变换，从中选择3个作为选项
-            # 确保正确答案在其中，其他的作为干扰项
-            if len(possible_transforms) >= 3:
-                return possible_transforms[:3]
-            else:
-                # 不够3个，添加一些其他变换作为干扰项
-                options = possible_transforms[:]
-                for perm in self.all_permutations:
-                    if perm not in options:
-                        options.append(perm)
-                        if len(options) >= 3:
-                            break
-                return options[:3]
-        
-        return None
+        correct_option = solutions[0][0]
+        return self._build_options(correct_option, self._variable_states(input_seqs, output_seqs, '1', ()))
+
+    def _auto_stages(self, question_type: str) -> List[Stage]:
+        """自动出题时各级的取值范围(恒等变换不作为固定变换)"""
+        if question_type == '1':
+            return [Stage.free()]
+        if question_type == '2':  # 第一次固定，第二次选择
+            return [self.non_identity, Stage.free()]
+        if question_type == '3':  # 第一次选择，第二次固定
+            return [self.non_identity, self.non_identity]
+        return [self.non_identity] * 3
+
+    def iter_auto_solutions(self, input_seqs: List[List[str]], output_seqs: List[List[str]],
+                            question_type: str, limit: Optional[int] = None) -> Iterator[Tuple[str, ...]]:
+        """自动模式下的全部有效组合(各级排列，按字典序)，惰性生成，最多limit个"""
+        solutions = self.iter_stages(input_seqs, output_seqs, self._auto_stages(question_type))
+        return (solution.perms for solution in itertools.islice(solutions, limit))
+
+    def count_auto_solutions(self, input_seqs: List[List[str]], output_seqs: List[List[str]],
+                             question_type: str) -> int:
+        """自动模式下有效组合的个数，只计数不生成组合"""
+        return self.count_stages(input_seqs, output_seqs, self._auto_stages(question_type))
 
     def auto_solve_q2_q3(self, input_seqs: List[List[str]], output_seqs: List[List[str]], 
                          question_type: str) -> Optional[Tuple[str, List[str]]]:
         """自动为Q2-Q3题型生成固定变换和可选变换"""
-        if not input_seqs or not output_seqs:
-            return None
-            
-        input_seq = input_seqs[0]
-        target_seq = output_seqs[0]
-        
-        # 尝试所有可能的两次变换组合，排除恒等变换
-        valid_combinations = []
-        
-        for perm1 in self.all_permutations:
-            # 排除恒等变换，确保是有意义的变换
-            if perm1 == '1234':
-                continue
-                
-            for perm2 in self.all_permutations:
-                if question_type == '2':  # 第一次固定，第二次选择
-                    intermediate = self.apply_permutation(input_seq, perm1)
-                    result = self.apply_permutation(intermediate, perm2)
-                    if result == target_seq:
-                        valid_combinations.append((perm1, perm2))  # (固定的, 可选的)
-                else:  # question_type == '3', 第一次选择，第二次固定
-                    # 排除第二次变换为恒等变换的情况
-                    if perm2 == '1234':
-                        continue
-                    intermediate = self.apply_permutation(input_seq, perm1)
-                    result = self.apply_permutation(intermediate, perm2)
-                    if result == target_seq:
-                        valid_combinations.append((perm2, perm1))  # (固定的, 可选的)
-        
-        if valid_combinations:
-            # 选择第一个有效组合作为基础
-            fixed_perm, correct_option = valid_combinations[0]
-            
-            # 生成3个选项，包含正确答案，排除恒等变换
-            options = [correct_option]
-            for perm in self.all_permutations:
-                if perm not in options and perm != '1234':
-                    options.append(perm)
-                    if len(options) >= 3:
-                        break
+        return self._memoize(('q2_q3', question_type), input_seqs, output_seqs,
+                             lambda: self._auto_solve_q2_q3(input_seqs, output_seqs, question_type))
+
+    def _auto_solve_q2_q3(self, input_seqs: List[List[str]], output_seqs: List[List[str]], 
+                          question_type: str) -> Optional[Tuple[str, List[str]]]:
+        """自动为Q2-Q3题型生成固定变换和可选变换(不经过缓存)"""
+        # 取字典序第一个有效组合，排除恒等变换
+        for perm1, perm2 in self.iter_auto_solutions(input_seqs, output_seqs, question_type, limit=1):
+            if question_type == '2':
+                fixed_perm, correct_option = perm1, perm2
+            else:
+                fixed_perm, correct_option = perm2, perm1
             
-            return fixed_perm, options[:3]
+            # 生成3个选项，包含正确答案，干扰项保证错误且不是平凡变换
+            states = self._variable_states(input_seqs, output_seqs, question_type, (fixed_perm,))
+            return fixed_perm, self._build_options(correct_option, states)
         
         return None
 
     def auto_solve_q4_q6(self, input_seqs: List[List[str]], output_seqs: List[List[str]], 
                          question_type: str) -> Optional[Tuple[str, str, List[str], int]]:
         """自动为Q4-Q6题型生成两个固定变换和一个可选变换"""
-        if not input_seqs or not output_seqs:
-            return None
-            
-        input_seq = input_seqs[0]
-        target_seq = output_seqs[0]
+        return self._memoize(('q4_q6', question_type), input_seqs, output_seqs,
+                             lambda: self._auto_solve_q4_q6(input_seqs, output_seqs, question_type))
+
+    def _auto_solve_q4_q6(self, input_seqs: List[List[str]], output_seqs: List[List[str]], 
+                          question_type: str) -> Optional[Tuple[str, str, List[str], int]]:
+        """自动为Q4-Q6题型生成两个固定变换和一个可选变换(不经过缓存)"""
         variable_position = int(question_type) - 3  # Q4->1, Q5->2, Q6->3
         
-        # 尝试所有可能的三次变换组合，排除恒等变换
-        valid_combinations = []
-        
-        for perm1 in self.all_permutations:
-            # 排除恒等变换
-            if perm1 == '1234':
-                continue
-            for perm2 in self.all_permutations:
-                if perm2 == '1234':
-                    continue
-                for perm3 in self.all_permutations:
-                    if perm3 == '1234':
-                        continue
-                        
-                    intermediate1 = self.apply_permutation(input_seq, perm1)
-                    intermediate2 = self.apply_permutation(intermediate1, perm2)
-                    result = self.apply_permutation(intermediate2, perm3)
-                    
-                    if result == target_seq:
-                        if variable_position == 1:  # Q4: 第1次可选
-                            valid_combinations.append((perm1, perm2, perm3))
-                        elif variable_position == 2:  # Q5: 第2次可选
-                            valid_combinations.append((perm2, perm1, perm3))
-                        else:  # variable_position == 3, Q6: 第3次可选
-                            valid_combinations.append((perm3, perm1, perm2))
-        
-        if valid_combinations:
-            # 选择第一个有效组合
-            correct_option, fixed1, fixed2 = valid_combinations[0]
-            
-            # 生成3个选项，包含正确答案，排除恒等变换
-            options = [correct_option]
-            for perm in self.all_permutations:
-                if perm not in options and perm != '1234':
-                    options.append(perm)
-                    if len(options) >= 3:
-                        break
+        # 取字典序第一个有效组合，三次变换都排除恒等变换
+        for perms in self.iter_auto_solutions(input_seqs, output_seqs, question_type, limit=1):
+            perms = list(perms)
+            correct_option = perms.pop(variable_position - 1)
+            fixed1, fixed2 = perms
             
-            return fixed1, fixed2, options[:3], variable_position
+            # 生成3个选项，包含正确答案，干扰项保证错误且不是平凡变换
+            states = self._variable_states(input_seqs, output_seqs, question_type, (fixed1, fixed2))
+            options = self._build_options(correct_option, states)
+            return fixed1, fixed2, options, variable_position
         
         return None
 
     def semi_auto_solve_q2_q3(self, input_seqs: List[List[str]], output_seqs: List[List[str]], 
                               question_type: str, fixed_perm: str) -> Optional[List[str]]:
         """半自动为Q2-Q3题型：给定固定变换，推导可选变换选项"""
-        if not input_seqs or not output_seqs:
-            return None
-            
-        input_seq = input_seqs[0]
-        target_seq = output_seqs[0]
-        
-        # 根据题型确定变换顺序
-        if question_type == '2':  # 第一次固定，第二次选择
-            intermediate = self.apply_permutation(input_seq, fixed_perm)
-            print(f"第一次变换后: {input_seq} -> {intermediate}")
-            
-            # 找到能从中间结果到目标的变换
-            correct_option = None
-            for perm in self.all_permutations:
-                result = self.apply_permutation(intermediate, perm)
-                if result == target_seq:
-                    correct_option = perm
-                    break
-        
-        else:  # question_type == '3', 第一次选择，第二次固定
-            # 需要找到第一次变换，使得经过固定的第二次变换后得到目标
-            correct_option = None
-            for perm in self.all_permutations:
-                intermediate = self.apply_permutation(input_seq, perm)
-                result = self.apply_permutation(intermediate, fixed_perm)
-                if result == target_seq:
-                    correct_option = perm
-                    break
-        
-        if correct_option:
-            # 生成3个选项，包含正确答案
-            options = [correct_option]
-            for perm in self.all_permutations:
-                if perm not in options:
-                    options.append(perm)
-                    if len(options) >= 3:
-                        break
-            
-            return options[:3]
-        
-        return None
+        return self._memoize(('semi_q2_q3', question_type, fixed_perm), input_seqs, output_seqs,
+                             lambda: self._semi_auto_options(input_seqs, output_seqs, question_type, (fixed_perm,)))
 
     def semi_auto_solve_q4_q6(self, input_seqs: List[List[str]], output_seqs: List[List[str]], 
                               question_type: str, fixed1: str, fixed2: str) -> Optional[List[str]]:
         """半自动为Q4-Q6题型：给定两个固定变换，推导可选变换选项"""
-        if not input_seqs or not output_seqs:
-            return None
-            
-        input_seq = input_seqs[0]
-        target_seq = output_seqs[0]
-        variable_position = int(question_type) - 3  # Q4->1, Q5->2, Q6->3
-        
-        correct_option = None
-        
-        if variable_position == 1:  # Q4: 第1次可选，第2,3次固定
-            for perm in self.all_permutations:
-                intermediate1 = self.apply_permutation(input_seq, perm)
-                intermediate2 = self.apply_permutation(intermediate1, fixed1)
-                result = self.apply_permutation(intermediate2, fixed2)
-                if result == target_seq:
-                    correct_option = perm
-                    break
-                    
-        elif variable_position == 2:  # Q5: 第2次可选，第1,3次固定
-            intermediate1 = self.apply_permutation(input_seq, fixed1)
-            for perm in self.all_permutations:
-                intermediate2 = self.apply_permutation(intermediate1, perm)
-                result = self.apply_permutation(intermediate2, fixed2)
-                if result == target_seq:
-                    correct_option = perm
-                    break
-                    
-        else:  # Q6: 第3次可选，第1,2次固定
-            intermediate1 = self.apply_permutation(input_seq, fixed1)
-            intermediate2 = self.apply_permutation(intermediate1, fixed2)
-            for perm in self.all_permutations:
-                result = self.apply_permutation(intermediate2, perm)
-                if result == target_seq:
-                    correct_option = perm
-                    break
-        
-        if correct_option:
+        return self._memoize(('semi_q4_q6', question_type, fixed1, fixed2), input_seqs, output_seqs,
+                             lambda: self._semi_auto_options(input_seqs, output_seqs, question_type,
+                                                             (fixed1, fixed2)))
+
+    def _semi_auto_options(self, input_seqs: List[List[str]], output_seqs: List[List[str]],
+                           question_type: str, fixed: Sequence[str]) -> Optional[List[str]]:
+        """半自动题型2-6：给定固定变换，推导可选变换选项(不经过缓存)"""
+        stages, variable_index = self.question_layout(question_type, fixed, Stage.free())
+        solutions = self.solve_stages(input_seqs, output_seqs, stages, limit=1)
+        if solutions:
             # 生成3个选项，包含正确答案
-            options = [correct_option]
-            for perm in self.all_permutations:
-                if perm not in options:
-                    options.append(perm)
-                    if len(options) >= 3:
-                        break
-            
-            return options[:3]
+            return self._build_options(solutions[0].perms[variable_index],
+                                       self._variable_states(input_seqs, output_seqs, question_type, fixed))
         
         return None
 
@@ -355,10 +507,10 @@ class VisualReasoningSolver:
         
         while True:
             perm_str = input("请输入固定变换: ").strip()
-            if len(perm_str) == 4 and all(c in '1234' for c in perm_str):
+            if self.is_permutation(perm_str):
                 print(f"固定变换: {perm_str}")
                 return perm_str
-            print("请输入4位排列数字!")
+            print(f"请输入{self.engine.n}位排列数字!")
 
     def get_q1_options(self) -> List[str]:
         """Q1: 获取3个变换选项"""
@@ -368,10 +520,10 @@ class VisualReasoningSolver:
         while True:
             options_str = input("请输入3个排列选项 (空格分隔，如: 2314 2341 3241): ").strip()
             options = options_str.split()
-            if len(options) == 3 and all(len(opt) == 4 and all(c in '1234' for c in opt) for opt in options):
+            if len(options) == 3 and all(self.is_permutation(opt) for opt in options):
                 print(f"变换选项: {options}")
                 return options
-            print("请输入3个4位排列数字，用空格分隔!")
+            print(f"请输入3个{self.engine.n}位排列数字，用空格分隔!")
 
     def get_q2_q3_options(self, question_type: str) -> Tuple[str, List[str]]:
         """Q2-Q3: 获取两次变换，一次固定，一次有3种可能"""
@@ -382,19 +534,19 @@ class VisualReasoningSolver:
             # 第一次变换固定
             while True:
                 fixed_str = input("请输入第一次变换(固定): ").strip()
-                if len(fixed_str) == 4 and all(c in '1234' for c in fixed_str):
+                if self.is_permutation(fixed_str):
                     print(f"第一次变换(固定): {fixed_str}")
                     break
-                print("请输入4位排列数字!")
+                print(f"请输入{self.engine.n}位排列数字!")
             
             # 第二次变换有3种可能
             while True:
                 options_str = input("请输入第二次变换的3个选项 (空格分隔): ").strip()
                 options = options_str.split()
-                if len(options) == 3 and all(len(opt) == 4 and all(c in '1234' for c in opt) for opt in options):
+                if len(options) == 3 and all(self.is_permutation(opt) for opt in options):
                     print(f"第二次变换选项: {options}")
                     return fixed_str, options
-                print("请输入3个4位排列数字，用空格分隔!")
+                print(f"请输入3个{self.engine.n}位排列数字，用空格分隔!")
         
         else:  # question_type == '3'
             print("\n=== Q3 两次变换(选首次-第二次固定) ===")
@@ -404,18 +556,18 @@ class VisualReasoningSolver:
             while True:
                 options_str = input("请输入第一次变换的3个选项 (空格分隔): ").strip()
                 options = options_str.split()
-                if len(options) == 3 and all(len(opt) == 4 and all(c in '1234' for c in opt) for opt in options):
+                if len(options) == 3 and all(self.is_permutation(opt) for opt in options):
                     print(f"第一次变换选项: {options}")
                     break
-                print("请输入3个4位排列数字，用空格分隔!")
+                print(f"请输入3个{self.engine.n}位排列数字，用空格分隔!")
             
             # 第二次变换固定
             while True:
                 fixed_str = input("请输入第二次变换(固定): ").strip()
-                if len(fixed_str) == 4 and all(c in '1234' for c in fixed_str):
+                if self.is_permutation(fixed_str):
                     print(f"第二次变换(固定): {fixed_str}")
                     return fixed_str, options
-                print("请输入4位排列数字!")
+                print(f"请输入{self.engine.n}位排列数字!")
 
     def get_q4_q6_options(self, question_type: str) -> Tuple[str, str, List[str], int]:
         """Q4-Q6: 获取三次变换，两次固定，一次有3种可能"""
@@ -437,103 +589,95 @@ class VisualReasoningSolver:
             while True:
                 options_str = input("请输入第一次变换的3个选项 (空格分隔): ").strip()
                 options = options_str.split()
-                if len(options) == 3 and all(len(opt) == 4 and all(c in '1234' for c in opt) for opt in options):
+                if len(options) == 3 and all(self.is_permutation(opt) for opt in options):
                     print(f"第一次变换选项: {options}")
                     break
-                print("请输入3个4位排列数字，用空格分隔!")
+                print(f"请输入3个{self.engine.n}位排列数字，用空格分隔!")
             
             # 第二次变换固定
             while True:
                 fixed1_str = input("请输入第二次变换(固定): ").strip()
-                if len(fixed1_str) == 4 and all(c in '1234' for c in fixed1_str):
+                if self.is_permutation(fixed1_str):
                     print(f"第二次变换(固定): {fixed1_str}")
                     break
-                print("请输入4位排列数字!")
+                print(f"请输入{self.engine.n}位排列数字!")
             
             # 第三次变换固定
             while True:
                 fixed2_str = input("请输入第三次变换(固定): ").strip()
-                if len(fixed2_str) == 4 and all(c in '1234' for c in fixed2_str):
+                if self.is_permutation(fixed2_str):
                     print(f"第三次变换(固定): {fixed2_str}")
                     return fixed1_str, fixed2_str, options, variable_position
-                print("请输入4位排列数字!")
+                print(f"请输入{self.engine.n}位排列数字!")
                 
         elif variable_position == 2:
             # 第一次变换固定
             while True:
                 fixed1_str = input("请输入第一次变换(固定): ").strip()
-                if len(fixed1_str) == 4 and all(c in '1234' for c in fixed1_str):
+                if self.is_permutation(fixed1_str):
                     print(f"第一次变换(固定): {fixed1_str}")
                     break
-                print("请输入4位排列数字!")
+                print(f"请输入{self.engine.n}位排列数字!")
             
             # 第二次变换有3种可能
             while True:
                 options_str = input("请输入第二次变换的3个选项 (空格分隔): ").strip()
                 options = options_str.split()
-                if len(options) == 3 and all(len(opt) == 4 and all(c in '1234' for c in opt) for opt in options):
+                if len(options) == 3 and all(self.is_permutation(opt) for opt in options):
                     print(f"第二次变换选项: {options}")
                     break
-                print("请输入3个4位排列数字，用空格分隔!")
+                print(f"请输入3个{self.engine.n}位排列数字，用空格分隔!")
             
             # 第三次变换固定
             while True:
                 fixed2_str = input("请输入第三次变换(固定): ").strip()
-                if len(fixed2_str) == 4 and all(c in '1234' for c in fixed2_str):
+                if self.is_permutation(fixed2_str):
                     print(f"第三次变换(固定): {fixed2_str}")
                     return fixed1_str, fixed2_str, options, variable_position
-                print("请输入4位排列数字!")
+                print(f"请输入{self.engine.n}位排列数字!")
                 
         else:  # variable_position == 3
             # 第一次变换固定
             while True:
                 fixed1_str = input("请输入第一次变换(固定): ").strip()
-                if len(fixed1_str) == 4 and all(c in '1234' for c in fixed1_str):
+                if self.is_permutation(fixed1_str):
                     print(f"第一次变换(固定): {fixed1_str}")
                     break
-                print("请输入4位排列数字!")
+                print(f"请输入{self.engine.n}位排列数字!")
             
             # 第二次变换固定
             while True:
                 fixed2_str = input("请输入第二次变换(固定): ").strip()
-                if len(fixed2_str) == 4 and all(c in '1234' for c in fixed2_str):
+                if self.is_permutation(fixed2_str):
                     print(f"第二次变换(固定): {fixed2_str}")
                     break
-                print("请输入4位排列数字!")
+                print(f"请输入{self.engine.n}位排列数字!")
             
             # 第三次变换有3种可能
             while True:
                 options_str = input("请输入第三次变换的3个选项 (空格分隔): ").strip()
                 options = options_str.split()
-                if len(options) == 3 and all(len(opt) == 4 and all(c in '1234' for c in opt) for opt in options):
+                if len(options) == 3 and all(self.is_permutation(opt) for opt in options):
                     print(f"第三次变换选项: {options}")
                     return fixed1_str, fixed2_str, options, variable_position
-                print("请输入3个4位排列数字，用空格分隔!")
+                print(f"请输入3个{self.engine.n}位排列数字，用空格分隔!")
 
     def get_permutation_options(self) -> Tuple[List[str], List[str]]:
         """获取Q11两步排列变换的选项"""
-        
-        print("\n=== 第一步排列选项 ===")
-        while True:
-            options_str = input("请输入第一步的3个排列选项 (空格分隔，如: 2314 2341 3241): ").strip()
-            options = options_str.split()
-            if len(options) == 3 and all(len(opt) == 4 and all(c in '1234' for c in opt) for opt in options):
-                print(f"第一步选项: {options}")
-                first_options = options
-                break
-            print("请输入3个4位排列数字，用空格分隔!")
-        
-        print("\n=== 第二步排列选项 ===")
+        first_options = self.get_step_options("第一步")
+        second_options = self.get_step_options("第二步")
+        return first_options, second_options
+
+    def get_step_options(self, step: str) -> List[str]:
+        """获取双管道中某一步的3个排列选项"""
+        print(f"\n=== {step}排列选项 ===")
         while True:
-            options_str = input("请输入第二步的3个排列选项 (空格分隔，如: 2314 2341 3241): ").strip()
+            options_str = input(f"请输入{step}的3个排列选项 (空格分隔，如: 2314 2341 3241): ").strip()
             options = options_str.split()
-            if len(options) == 3 and all(len(opt) == 4 and all(c in '1234' for c in opt) for opt in options):
-                print(f"第二步选项: {options}")
-                second_options = options
-                break
-            print("请输入3个4位排列数字，用空格分隔!")
-        
-        return first_options, second_options
+            if len(options) == 3 and all(self.is_permutation(opt) for opt in options):
+                print(f"{step}选项: {options}")
+                return options
+            print(f"请输入3个{self.engine.n}位排列数字，用空格分隔!")
 
 
     def apply_permutation(self, sequence: List[str], permutation: str) -> List[str]:
@@ -541,8 +685,16 @@ class VisualReasoningSolver:
         应用排列变换
         permutation: 如 "2314" 表示新位置i的元素来自原位置permutation[i-1]
         """
+        code = self.encode_sequence(sequence)
+        perm_id = self.engine.perm_id(permutation)
+        if code is not None and perm_id is not None:
+            return self.decode_sequence(self.engine.action[perm_id][code])
+        
+        # 非标准输入，逐位变换
         if len(permutation) != len(sequence):
             return sequence
+        if self.engine.counting:
+            self.engine.applications += 1
         
         result = [''] * len(sequence)
         for new_pos in range(len(sequence)):
@@ -555,170 +707,201 @@ class VisualReasoningSolver:
     def solve_two_step_permutation(self, input_seqs: List[List[str]], 
                                   output_seqs: List[List[str]], 
                                   first_options: List[str], 
-                                  second_options: List[str]) -> Tuple[int, int]:
+                                  second_options: List[str]) -> 'SolveResult':
         """
         Q11专用：解决两步排列问题
         """
+        result = SolveResult('7', options=(first_options, second_options))
+        if input_seqs and output_seqs:
+            result.input_seq, result.target_seq = input_seqs[0], output_seqs[0]
+        matches = self.match_options(input_seqs, output_seqs, [first_options, second_options])
+        if matches:
+            i, j = matches[0]
+            result.answer = (i + 1, j + 1)
+            result.path = [result.input_seq] + trace_pipeline(result.input_seq, [first_options[i], second_options[j]])
+            result.candidates = tuple(sorted({match[stage] + 1 for match in matches}) for stage in range(2))
+        return result
+
+    def _solve_variable_stage(self, question_type: str, input_seqs: List[List[str]],
+                              output_seqs: List[List[str]], fixed: Tuple[str, ...],
+                              options: List[str]) -> 'SolveResult':
+        """题型1-6共用：求出唯一可选那一级的答案、中间序列和仍然可行的选项"""
+        stages, variable_index = self.question_layout(question_type, fixed, Stage.options(options))
+        options = list(options)
+        result = SolveResult(question_type, fixed=fixed, options=options, variable_position=variable_index + 1)
         if not input_seqs or not output_seqs:
-            return -1, -1
-            
-        input_seq = input_seqs[0]
-        target_seq = output_seqs[0]
+            return result
         
-        # 尝试所有组合
-        for i, perm1 in enumerate(first_options):
-            # 应用第一次排列
-            intermediate = self.apply_permutation(input_seq, perm1)
-            
-            for j, perm2 in enumerate(second_options):
-                # 应用第二次排列
-                final_result = self.apply_permutation(intermediate, perm2)
-                
-                # 检查是否匹配目标
-                if final_result == target_seq:
-                    print(f"\n✅ 找到正确的排列组合!")
-                    print(f"第一步: 选择排列{i+1} ({perm1})")
-                    print(f"  {input_seq} -> {intermediate}")
-                    print(f"第二步: 选择排列{j+1} ({perm2})")
-                    print(f"  {intermediate} -> {final_result}")
-                    print(f"结果匹配目标: {final_result} = {target_seq}")
-                    
-                    return i+1, j+1
-        
-        print("\n❌ 未找到匹配的排列组合")
-        return -1, -1
+        result.input_seq, result.target_seq = input_seqs[0], output_seqs[0]
+        # 其余各级都是固定变换，每个可行选项恰好对应一组解，一次搜索即可得到全部候选
+        solutions = self.solve_stages(input_seqs, output_seqs, stages)
+        if solutions:
+            solution = solutions[0]
+            result.answer = solution.choices[variable_index] + 1
+            result.path = [result.input_seq] + trace_pipeline(result.input_seq, solution.perms)
+            result.candidates = tuple(s.choices[variable_index] + 1 for s in solutions)
+        return result
 
     def solve_q1(self, input_seqs: List[List[str]], output_seqs: List[List[str]], 
-                 permutation_options: List[str]) -> int:
+                 permutation_options: List[str]) -> 'SolveResult':
         """Q1: 单次变换"""
-        if not input_seqs or not output_seqs:
-            return -1
-            
-        input_seq = input_seqs[0]
-        target_seq = output_seqs[0]
-        
-        print(f"\n分析Q1单次变换:")
-        print(f"输入: {input_seq}")
-        print(f"目标: {target_seq}")
-        
-        for i, perm in enumerate(permutation_options):
-            result = self.apply_permutation(input_seq, perm)
-            if result == target_seq:
-                print(f"\n✅ 找到正确的变换!")
-                print(f"选择变换 {i+1} ({perm})")
-                print(f"  {input_seq} -> {result}")
-                return i + 1
-        
-        print("\n❌ 未找到匹配的变换")
-        return -1
+        return self._solve_variable_stage('1', input_seqs, output_seqs, (), permutation_options)
 
     def solve_q2_q3(self, input_seqs: List[List[str]], output_seqs: List[List[str]], 
-                    fixed_perm: str, variable_options: List[str], question_type: str) -> int:
+                    fixed_perm: str, variable_options: List[str], question_type: str) -> 'SolveResult':
         """Q2-Q3: 两次变换，一次固定，一次可选"""
-        if not input_seqs or not output_seqs:
-            return -1
-            
-        input_seq = input_seqs[0]
-        target_seq = output_seqs[0]
-        
-        print(f"\n分析Q{question_type}两次变换:")
-        print(f"输入: {input_seq}")
-        print(f"目标: {target_seq}")
-        
-        if question_type == '2':  # 选后面，第一次固定
-            print(f"第一次变换(固定): {fixed_perm}")
-            intermediate = self.apply_permutation(input_seq, fixed_perm)
-            print(f"中间结果: {input_seq} -> {intermediate}")
-            
-            for i, perm in enumerate(variable_options):
-                result = self.apply_permutation(intermediate, perm)
-                if result == target_seq:
-                    print(f"\n✅ 找到正确的第二次变换!")
-                    print(f"第二次变换选择 {i+1} ({perm})")
-                    print(f"  {intermediate} -> {result}")
-                    return i + 1
-        
-        else:  # question_type == '3', 选首次，第二次固定
-            print(f"第二次变换(固定): {fixed_perm}")
-            
-            for i, perm in enumerate(variable_options):
-                intermediate = self.apply_permutation(input_seq, perm)
-                result = self.apply_permutation(intermediate, fixed_perm)
-                if result == target_seq:
-                    print(f"\n✅ 找到正确的第一次变换!")
-                    print(f"第一次变换选择 {i+1} ({perm})")
-                    print(f"  {input_seq} -> {intermediate} -> {result}")
-                    return i + 1
-        
-        print("\n❌ 未找到匹配的变换")
-        return -1
+        return self._solve_variable_stage(question_type, input_seqs, output_seqs, (fixed_perm,), variable_options)
 
     def solve_q4_q6(self, input_seqs: List[List[str]], output_seqs: List[List[str]], 
-                    fixed1: str, fixed2: str, variable_options: List[str], variable_position: int) -> int:
+                    fixed1: str, fixed2: str, variable_options: List[str], variable_position: int) -> 'SolveResult':
         """Q4-Q6: 三次变换，两次固定，一次可选"""
+        return self._solve_variable_stage(str(variable_position + 3), input_seqs, output_seqs, (fixed1, fixed2),
+                                          variable_options)
+
+    @staticmethod
+    def _option_list(value) -> Optional[List[str]]:
+        """选项既可以是列表，也可以是空格分隔的字符串"""
+        if value is None:
+            return None
+        if isinstance(value, str):
+            return value.split()
+        return [str(perm) for perm in value]
+
+    def solve_puzzle(self, puzzle: dict) -> dict:
+        """无交互求解一道题，返回可直接序列化为JSON的结果
+
+        puzzle字段: type(1-7或pipeline)、input、output，
+        以及按题型需要的 fixed、options、first_options、second_options、stages。
+        题型1-6未给出选项时按自动/半自动模式推导。
+        """
+        question_type = str(puzzle.get('type', ''))
+        result = {'id': puzzle['id']} if 'id' in puzzle else {}
+        
+        if question_type == 'pipeline':
+            result['type'] = question_type
+            # 任意位数、任意级数的管道，序列按原样参与求解；含排列以外的变换时在变换代数上求解
+            solve = solve_transforms if is_transform_spec(puzzle['stages']) else solve_pipeline
+            solutions = solve(str(puzzle['input']), str(puzzle['output']), puzzle['stages'],
+                              limit=puzzle.get('limit', 1), brute_force=self.solve_mode == 'brute_force')
+            result['status'] = 'ok' if solutions else 'no_solution'
+            result['solutions'] = [{'choices': list(s.choices), 'perms': list(s.perms)} for s in solutions]
+            return result
+        
+        if question_type not in self.question_types:
+            raise ValueError(f"未知题型: {question_type}")
+        input_seqs = self.parse_sequence(str(puzzle.get('input', '')))
+        output_seqs = self.parse_sequence(str(puzzle.get('output', '')))
         if not input_seqs or not output_seqs:
-            return -1
-            
-        input_seq = input_seqs[0]
-        target_seq = output_seqs[0]
+            raise ValueError("缺少输入或输出序列")
         
-        print(f"\n分析Q{4 + variable_position - 1}三次变换:")
-        print(f"输入: {input_seq}")
-        print(f"目标: {target_seq}")
-        print(f"第{variable_position}次变换不固定(3种选择)")
+        fixed, options = self._puzzle_fields(puzzle, question_type)
         
-        if variable_position == 1:  # Q4: 第1次不固定
-            print(f"第2次变换(固定): {fixed1}")
-            print(f"第3次变换(固定): {fixed2}")
-            
-            for i, perm in enumerate(variable_options):
-                intermediate1 = self.apply_permutation(input_seq, perm)
-                intermediate2 = self.apply_permutation(intermediate1, fixed1)
-                result = self.apply_permutation(intermediate2, fixed2)
-                
-                if result == target_seq:
-                    print(f"\n✅ 找到正确的第1次变换!")
-                    print(f"第1次变换选择 {i+1} ({perm})")
-                    print(f"  {input_seq} -> {intermediate1} -> {intermediate2} -> {result}")
-                    return i + 1
-                    
-        elif variable_position == 2:  # Q5: 第2次不固定
-            print(f"第1次变换(固定): {fixed1}")
-            print(f"第3次变换(固定): {fixed2}")
-            
-            intermediate1 = self.apply_permutation(input_seq, fixed1)
-            print(f"第1次结果: {input_seq} -> {intermediate1}")
-            
-            for i, perm in enumerate(variable_options):
-                intermediate2 = self.apply_permutation(intermediate1, perm)
-                result = self.apply_permutation(intermediate2, fixed2)
-                
-                if result == target_seq:
-                    print(f"\n✅ 找到正确的第2次变换!")
-                    print(f"第2次变换选择 {i+1} ({perm})")
-                    print(f"  {intermediate1} -> {intermediate2} -> {result}")
-                    return i + 1
-                    
-        else:  # variable_position == 3, Q6: 第3次不固定
-            print(f"第1次变换(固定): {fixed1}")
-            print(f"第2次变换(固定): {fixed2}")
-            
-            intermediate1 = self.apply_permutation(input_seq, fixed1)
-            intermediate2 = self.apply_permutation(intermediate1, fixed2)
-            print(f"前两次结果: {input_seq} -> {intermediate1} -> {intermediate2}")
-            
-            for i, perm in enumerate(variable_options):
-                result = self.apply_permutation(intermediate2, perm)
-                
-                if result == target_seq:
-                    print(f"\n✅ 找到正确的第3次变换!")
-                    print(f"第3次变换选择 {i+1} ({perm})")
-                    print(f"  {intermediate2} -> {result}")
-                    return i + 1
+        # 单组样例且形状互不相同时直接读取答案图谱
+        if self.atlas is not None and question_type != '7':
+            answer = self.atlas.solve(question_type, input_seqs, output_seqs, fixed, options)
+            if answer is not None:
+                result.update(answer)
+                return result
+        
+        # 除序列本身以外的题目字段都参与缓存键
+        extras = _freeze({key: value for key, value in puzzle.items() if key not in ('id', 'input', 'output')})
+        result.update(self._memoize(('puzzle', extras), input_seqs, output_seqs,
+                                    lambda: self._solve_puzzle(question_type, input_seqs, output_seqs,
+                                                               fixed, options)))
+        return result
+
+    def _puzzle_fields(self, puzzle: dict, question_type: str) -> tuple:
+        """读取题目中的固定变换和选项，题型7的选项为两条管道的选项列表"""
+        if question_type == '7':
+            # 双管道用 first_options/second_options；多条管道用 pipes 按顺序给出各级选项
+            if 'pipes' in puzzle:
+                pipes = [self._option_list(options) for options in puzzle['pipes']]
+                if not pipes or None in pipes:
+                    raise ValueError("pipes需要为每条管道给出选项")
+                return None, pipes
+            return None, [self._option_list(puzzle['first_options']),
+                          self._option_list(puzzle['second_options'])]
+        fixed = puzzle.get('fixed')
+        options = self._option_list(puzzle.get('options'))
+        if question_type != '1' and fixed is None and options is not None:
+            # 自动推导会连同选项一起生成，给出的选项无从对应
+            raise ValueError("题型2-6给出options时必须同时给出fixed")
+        if question_type in ['2', '3'] and fixed is not None:
+            # 与选项一样接受数字或字符串
+            if isinstance(fixed, bool) or not isinstance(fixed, (int, str)):
+                raise ValueError("题型2-3的fixed需要是一个排列")
+            fixed = str(fixed)
+        if question_type in ['4', '5', '6']:
+            fixed = self._option_list(fixed)
+            if fixed is not None and len(fixed) != 2:
+                raise ValueError("题型4-6需要两个固定变换")
+        return fixed, options
+
+    def _solve_puzzle(self, question_type: str, input_seqs: List[List[str]], output_seqs: List[List[str]],
+                      fixed, options) -> dict:
+        """求解题型1-7(不经过缓存)，结果不含题目id"""
+        result = {'type': question_type}
+        if question_type == '7':
+            return self._solve_pipes(result, input_seqs, output_seqs, options)
+        if question_type == '1':
+            if options is None:
+                options = self.auto_solve_q1(input_seqs, output_seqs)
+            fixed_stages = ()
+        elif question_type in ['2', '3']:
+            if fixed is None:
+                derived = self.auto_solve_q2_q3(input_seqs, output_seqs, question_type)
+                fixed, options = derived if derived else (None, None)
+            elif options is None:
+                options = self.semi_auto_solve_q2_q3(input_seqs, output_seqs, question_type, fixed)
+            fixed_stages = (fixed,)
+        else:  # question_type in ['4', '5', '6']
+            if fixed is None:
+                derived = self.auto_solve_q4_q6(input_seqs, output_seqs, question_type)
+                if derived:
+                    fixed1, fixed2, options, _ = derived
+                    fixed = [fixed1, fixed2]
+            elif options is None:
+                options = self.semi_auto_solve_q4_q6(input_seqs, output_seqs, question_type, *fixed)
+            fixed_stages = fixed
+        
+        if fixed is not None:
+            result['fixed'] = fixed
+        if options is not None:
+            result['options'] = options
+        record = self._solve_variable_stage(question_type, input_seqs, output_seqs, fixed_stages, options) \
+            if options else None
+        if record is None or record.answer is None:
+            result['status'] = 'no_solution'
+            return result
         
-        print("\n❌ 未找到匹配的变换")
-        return -1
+        result['status'] = 'ok'
+        result['answer'] = record.answer
+        result['choice'] = record.choice
+        # 所有样例下仍然可行的选项编号，多于一个即答案不唯一
+        result['candidates'] = list(record.candidates)
+        result['ambiguous'] = len(record.candidates) > 1
+        # 重复形状时可选那一级的全部正确排列
+        equivalent = self._equivalents(input_seqs, output_seqs, question_type, fixed_stages)
+        if len(equivalent) > 1:
+            result['equivalent'] = equivalent
+        return result
 
+    def _solve_pipes(self, result: dict, input_seqs: List[List[str]], output_seqs: List[List[str]],
+                     option_lists: List[List[str]]) -> dict:
+        """题型7：列出所有可行组合，answer取字典序第一组，matches给出全部组合"""
+        result['options'] = option_lists
+        matches = self.match_options(input_seqs, output_seqs, option_lists)
+        if not matches:
+            result['status'] = 'no_solution'
+            return result
+        
+        result['status'] = 'ok'
+        result['answer'] = [choice + 1 for choice in matches[0]]
+        result['choice'] = [options[choice] for options, choice in zip(option_lists, matches[0])]
+        result['candidates'] = [sorted({match[stage] + 1 for match in matches}) for stage in range(len(option_lists))]
+        result['matches'] = [[choice + 1 for choice in match] for match in matches]
+        result['ambiguous'] = len(matches) > 1
+        return result
 
     def run(self):
         """运行主程序"""
@@ -730,8 +913,12 @@ class VisualReasoningSolver:
         # 获取模式选择
         mode = self.get_mode_choice(question_type)
         
-        # 获取输入输出序列
+        # 获取输入输出序列；之后每输入一项条件都立即收窄候选
         input_seqs, output_seqs = self.get_input_output_sequences()
+        presenter = ConsolePresenter()
+        session = SolveSession(self, question_type)
+        session.set_sequences(input_seqs, output_seqs)
+        presenter.show_progress(session)
         
         # 根据题型决定输入方式和求解方法
         print("\n" + "="*50)
@@ -745,19 +932,19 @@ class VisualReasoningSolver:
                 return
             print(f"🤖 自动推导出的变换选项: {options}")
             
-            answer = self.solve_q1(input_seqs, output_seqs, options)
-            
-            if answer > 0:
-                print(f"\n最终答案: 选项 {answer} ({options[answer-1]})")
-            else:
-                print("\n未能找到匹配的变换")
+            result = self.solve_q1(input_seqs, output_seqs, options)
                 
         elif question_type in ['2', '3']:  # Q2-Q3: 两次变换
             if question_type == '2':
                 fixed_perm = self.get_fixed_permutation("=== Q2 两次变换(第1次固定,第2次选择) ===")
             else:
                 fixed_perm = self.get_fixed_permutation("=== Q3 两次变换(第2次固定,第1次选择) ===")
+            session.fix_next(fixed_perm)
+            presenter.show_progress(session)
             
+            if question_type == '2' and input_seqs:
+                intermediate = self.apply_permutation(input_seqs[0], fixed_perm)
+                print(f"第一次变换后: {input_seqs[0]} -> {intermediate}")
             variable_options = self.semi_auto_solve_q2_q3(input_seqs, output_seqs, question_type, fixed_perm)
             if variable_options is None:
                 print("❌ 无法根据给定的固定变换推导出解，请检查输入")
@@ -765,28 +952,23 @@ class VisualReasoningSolver:
             
             print(f"🤖 根据固定变换推导出的可选变换: {variable_options}")
             
-            answer = self.solve_q2_q3(input_seqs, output_seqs, fixed_perm, variable_options, question_type)
-            
-            if answer > 0:
-                if question_type == '2':
-                    print(f"\n最终答案: 第二次变换选项 {answer} ({variable_options[answer-1]})")
-                else:
-                    print(f"\n最终答案: 第一次变换选项 {answer} ({variable_options[answer-1]})")
-            else:
-                print("\n未能找到匹配的变换")
+            result = self.solve_q2_q3(input_seqs, output_seqs, fixed_perm, variable_options, question_type)
                 
         elif question_type in ['4', '5', '6']:  # Q4-Q6: 三次变换
             variable_position = int(question_type) - 3
             
             if question_type == '4':  # Q4: 第1次可选，第2,3次固定
-                fixed1 = self.get_fixed_permutation("=== Q4 第2次变换(固定) ===")
-                fixed2 = self.get_fixed_permutation("=== Q4 第3次变换(固定) ===")
+                prompts = ("=== Q4 第2次变换(固定) ===", "=== Q4 第3次变换(固定) ===")
             elif question_type == '5':  # Q5: 第2次可选，第1,3次固定
-                fixed1 = self.get_fixed_permutation("=== Q5 第1次变换(固定) ===")
-                fixed2 = self.get_fixed_permutation("=== Q5 第3次变换(固定) ===")
+                prompts = ("=== Q5 第1次变换(固定) ===", "=== Q5 第3次变换(固定) ===")
             else:  # Q6: 第3次可选，第1,2次固定
-                fixed1 = self.get_fixed_permutation("=== Q6 第1次变换(固定) ===")
-                fixed2 = self.get_fixed_permutation("=== Q6 第2次变换(固定) ===")
+                prompts = ("=== Q6 第1次变换(固定) ===", "=== Q6 第2次变换(固定) ===")
+            fixed1, fixed2 = None, None
+            for prompt in prompts:
+                fixed_perm = self.get_fixed_permutation(prompt)
+                session.fix_next(fixed_perm)
+                presenter.show_progress(session)
+                fixed1, fixed2 = (fixed_perm, None) if fixed1 is None else (fixed1, fixed_perm)
             
             variable_options = self.semi_auto_solve_q4_q6(input_seqs, output_seqs, question_type, fixed1, fixed2)
             if variable_options is None:
@@ -795,23 +977,18 @@ class VisualReasoningSolver:
             
             print(f"🤖 根据固定变换推导出的可选变换: {variable_options}")
             
-            answer = self.solve_q4_q6(input_seqs, output_seqs, fixed1, fixed2, variable_options, variable_position)
-            
-            if answer > 0:
-                print(f"\n最终答案: 第{variable_position}次变换选项 {answer} ({variable_options[answer-1]})")
-            else:
-                print("\n未能找到匹配的变换")
+            result = self.solve_q4_q6(input_seqs, output_seqs, fixed1, fixed2, variable_options, variable_position)
                 
         elif question_type == '7':  # Q11: 两步排列变换
-            first_options, second_options = self.get_permutation_options()
+            first_options = self.get_step_options("第一步")
+            session.restrict(0, first_options)
+            presenter.show_progress(session)
+            second_options = self.get_step_options("第二步")
+            session.restrict(1, second_options)
             result = self.solve_two_step_permutation(input_seqs, output_seqs, first_options, second_options)
-            
-            if result[0] > 0 and result[1] > 0:
-                print(f"\n最终答案:")
-                print(f"第一步变换: 选项 {result[0]} ({first_options[result[0]-1]})")
-                print(f"第二步变换: 选项 {result[1]} ({second_options[result[1]-1]})")
-            else:
-                print("\n未能找到匹配的排列组合")
+        
+        presenter.show_solution(result)
+        presenter.show_answer(result)
         
         # 显示题型信息
         print(f"\n题型: {self.question_types[question_type]}")
@@ -823,20 +1000,135 @@ class VisualReasoningSolver:
 
 def main():
     """主函数"""
-    solver = VisualReasoningSolver()
+    parser = argparse.ArgumentParser(description="管道推理题求解器")
+    parser.add_argument(
+        "--symbols",
+        type=int,
+        default=4,
+        choices=range(1, len(ALL_SHAPES) + 1),
+        help="序列中的形状数量(默认4)",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=SOLVE_MODES,
+        default="algebraic",
+        help="求解模式(默认algebraic；vectorized需要NumPy)",
+    )
+    parser.add_argument(
+        "--batch",
+        metavar="FILE",
+        help="批量模式: 从JSON Lines文件读取题目(- 表示标准输入)，不进行交互",
+    )
+    parser.add_argument(
+        "--output",
+        metavar="FILE",
+        default="-",
+        help="批量模式的结果文件(默认标准输出)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="批量模式的进程数(默认1，即单进程)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=1000,
+        help="多进程模式下每个任务包含的题目数(默认1000)",
+    )
+    parser.add_argument(
+        "--max-pending",
+        type=int,
+        default=None,
+        help="多进程模式下同时在途的任务数上限(默认进程数的2倍)",
+    )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="服务模式: 常驻内存，通过本机HTTP(默认端口8765)或Unix套接字接收题目",
+    )
+    parser.add_argument(
+        "--socket",
+        metavar="PATH",
+        help="服务模式下改用Unix套接字",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8765,
+        help="服务模式的HTTP端口(默认8765，只监听127.0.0.1)",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=("stats", "trace", "cprofile", "tracemalloc"),
+        help="性能观测: stats计数与分阶段耗时, trace逐次调用的CSV, cprofile/tracemalloc分析报告"
+             "(批量模式下仅单进程)",
+    )
+    parser.add_argument(
+        "--profile-output",
+        metavar="FILE",
+        help="观测结果写入的文件(默认标准错误)",
+    )
+    parser.add_argument(
+        "--build-atlas",
+        metavar="FILE",
+        nargs="?",
+        const=ATLAS_PATH,
+        help="生成答案图谱后退出(默认写到程序所在目录的pipe_atlas.bin)",
+    )
+    args = parser.parse_args()
     
-    while True:
+    if args.build_atlas is not None:
+        reference = VisualReasoningSolver(num_symbols=args.symbols, cache_size=0, atlas_path=None)
+        size = build_atlas(reference, args.build_atlas)
+        atlas = load_atlas(reference.engine, args.build_atlas)
         try:
-            solver.run()
-            
-            print("\n" + "-"*50)
+            checked = verify_atlas(reference, atlas)
+        finally:
+            atlas.close()
+        print(f"已生成答案图谱: {args.build_atlas} ({size}字节，已抽查{checked}道题)", file=sys.stderr)
+        return
+    
+    if args.serve:
+        from solve_server import run_server
+        where = args.socket if args.socket else f"http://127.0.0.1:{args.port}"
+        print(f"服务已启动: {where} (Ctrl+C退出)", file=sys.stderr)
+        run_server(socket_path=args.socket, port=args.port, num_symbols=args.symbols, solve_mode=args.mode)
+        return
+    
+    solver = VisualReasoningSolver(solve_mode=args.mode, num_symbols=args.symbols)
+    profiling = contextlib.nullcontext()
+    if args.profile is not None:
+        from instrumentation import profile_session
+        profiling = profile_session(solver, args.profile, args.profile_output)
+        if args.batch is not None and args.workers > 1:
+            print("性能观测只支持单进程，已改为单进程求解", file=sys.stderr)
+            args.workers = 1
+    
+    if args.batch is not None:
+        from batch_solver import run_batch
+        with profiling:
+            counts = run_batch(args.batch, args.output, num_symbols=args.symbols, workers=args.workers,
+                               chunk_size=args.chunk_size, max_pending=args.max_pending, solve_mode=args.mode,
+                               solver=solver)
+        print(f"完成: 成功 {counts['ok']}，无解 {counts['no_solution']}，错误 {counts['error']}",
+              file=sys.stderr)
+        return
+    
+    with profiling:
+        while True:
+            try:
+                solver.run()
                 
-        except KeyboardInterrupt:
-            print("\n\n程序已退出")
-            break
-        except Exception as e:
-            print(f"\n发生错误: {e}")
-            print("请重新开始")
+                print("\n" + "-"*50)
+                    
+            except KeyboardInterrupt:
+                print("\n\n程序已退出")
+                break
+            except Exception as e:
+                print(f"\n发生错误: {e}")
+                print("请重新开始")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""控制台展示：把求解结果(SolveResult)渲染为交互模式下的分析过程和最终答案
+
+求解本身不做任何输出，只有交互模式通过这里打印，批量调用不产生格式化和写出的开销。
+"""
+
+import sys
+from typing import IO, Optional
+
+from perm_engine import Stage, trace_pipeline
+
+# 题型2/3中可选变换是第几次变换
+_STEP_NAMES = {1: '第一次', 2: '第二次'}
+# 双管道的两步
+_PIPE_STEPS = ('第一步', '第二步')
+
+
+class ConsolePresenter:
+    """按题型把 SolveResult 打印到控制台"""
+
+    def __init__(self, stream: Optional[IO[str]] = None):
+        self.stream = stream
+
+    def _print(self, *args) -> None:
+        print(*args, file=self.stream if self.stream is not None else sys.stdout)
+
+    def show_solution(self, result) -> None:
+        """打印分析过程(对应求解前后的中间结果)"""
+        if result.question_type == '7':
+            self._show_pipes(result)
+        elif result.input_seq is None:
+            return
+        elif result.question_type == '1':
+            self._show_q1(result)
+        elif result.question_type in ['2', '3']:
+            self._show_q2_q3(result)
+        else:
+            self._show_q4_q6(result)
+
+    def show_answer(self, result) -> None:
+        """打印最终答案"""
+        if result.question_type == '7':
+            if result.answer is None:
+                self._print("\n未能找到匹配的排列组合")
+                return
+            first_options, second_options = result.options
+            i, j = result.answer
+            self._print(f"\n最终答案:")
+            self._print(f"第一步变换: 选项 {i} ({first_options[i-1]})")
+            self._print(f"第二步变换: 选项 {j} ({second_options[j-1]})")
+            return
+        if result.answer is None:
+            self._print("\n未能找到匹配的变换")
+            return
+        answer = result.answer
+        option = result.options[answer - 1]
+        if result.question_type == '1':
+            self._print(f"\n最终答案: 选项 {answer} ({option})")
+        elif result.question_type in ['2', '3']:
+            self._print(f"\n最终答案: {_STEP_NAMES[result.variable_position]}变换选项 {answer} ({option})")
+        else:
+            self._print(f"\n最终答案: 第{result.variable_position}次变换选项 {answer} ({option})")
+
+    def show_progress(self, session) -> None:
+        """增量求解：每输入一项条件后，打印可选那几级的剩余候选，唯一时提前给出答案"""
+        if not session.has_examples:
+            return
+        if not session.solvable:
+            self._print("⚠️ 当前条件下已无解，请检查输入")
+            return
+        for index in session.variable_positions:
+            step = _PIPE_STEPS[index] if session.question_type == '7' else f"第{index + 1}次变换"
+            if session.stages[index].kind == Stage.OPTIONS:
+                remaining = session.option_candidates(index)
+                if len(remaining) == 1:
+                    self._print(f"⚡ {step}已确定: 选项 {remaining[0]} ({session.decided(index)})")
+                else:
+                    self._print(f"🔎 {step}仍可行的选项: {remaining}")
+                continue
+            perm = session.decided(index)
+            if perm is not None:
+                self._print(f"⚡ {step}已确定: {perm}")
+            else:
+                self._print(f"🔎 {step}剩余候选: {len(session.candidates(index))} 个")
+
+    def _show_header(self, title: str, result) -> None:
+        self._print(f"\n{title}")
+        self._print(f"输入: {result.input_seq}")
+        self._print(f"目标: {result.target_seq}")
+
+    def _show_q1(self, result) -> None:
+        self._show_header("分析Q1单次变换:", result)
+        if result.answer is None:
+            self._print("\n❌ 未找到匹配的变换")
+            return
+        self._print(f"\n✅ 找到正确的变换!")
+        self._print(f"选择变换 {result.answer} ({result.choice})")
+        self._print(f"  {result.input_seq} -> {result.target_seq}")
+
+    def _show_q2_q3(self, result) -> None:
+        self._show_header(f"分析Q{result.question_type}两次变换:", result)
+        input_seq, target_seq = result.input_seq, result.target_seq
+        fixed_perm = result.fixed[0]
+        if result.question_type == '2':  # 选后面，第一次固定
+            self._print(f"第一次变换(固定): {fixed_perm}")
+            intermediate = trace_pipeline(input_seq, [fixed_perm])[0]
+            self._print(f"中间结果: {input_seq} -> {intermediate}")
+        else:  # 选首次，第二次固定
+            self._print(f"第二次变换(固定): {fixed_perm}")
+        if result.answer is None:
+            self._print("\n❌ 未找到匹配的变换")
+            return
+        step = _STEP_NAMES[result.variable_position]
+        self._print(f"\n✅ 找到正确的{step}变换!")
+        self._print(f"{step}变换选择 {result.answer} ({result.choice})")
+        if result.question_type == '2':
+            self._print(f"  {intermediate} -> {target_seq}")
+        else:
+            self._print(f"  {input_seq} -> {result.path[1]} -> {target_seq}")
+
+    def _show_q4_q6(self, result) -> None:
+        position = result.variable_position
+        self._show_header(f"分析Q{4 + position - 1}三次变换:", result)
+        input_seq = result.input_seq
+        fixed1, fixed2 = result.fixed
+        self._print(f"第{position}次变换不固定(3种选择)")
+        if position == 1:  # Q4: 第1次不固定
+            self._print(f"第2次变换(固定): {fixed1}")
+            self._print(f"第3次变换(固定): {fixed2}")
+        elif position == 2:  # Q5: 第2次不固定
+            self._print(f"第1次变换(固定): {fixed1}")
+            self._print(f"第3次变换(固定): {fixed2}")
+            self._print(f"第1次结果: {input_seq} -> {trace_pipeline(input_seq, [fixed1])[0]}")
+        else:  # Q6: 第3次不固定
+            self._print(f"第1次变换(固定): {fixed1}")
+            self._print(f"第2次变换(固定): {fixed2}")
+            intermediate1, intermediate2 = trace_pipeline(input_seq, [fixed1, fixed2])
+            self._print(f"前两次结果: {input_seq} -> {intermediate1} -> {intermediate2}")
+        if result.answer is None:
+            self._print("\n❌ 未找到匹配的变换")
+            return
+        # 从不固定的那一次变换之前开始展示
+        self._print(f"\n✅ 找到正确的第{position}次变换!")
+        self._print(f"第{position}次变换选择 {result.answer} ({result.choice})")
+        self._print("  " + " -> ".join(str(seq) for seq in result.path[position - 1:]))
+
+    def _show_pipes(self, result) -> None:
+        if result.answer is None:
+            self._print("\n❌ 未找到匹配的排列组合")
+            return
+        (i, j), (perm1, perm2) = result.answer, result.choice
+        input_seq, intermediate, final_result = result.path
+        self._print(f"\n✅ 找到正确的排列组合!")
+        self._print(f"第一步: 选择排列{i} ({perm1})")
+        self._print(f"  {input_seq} -> {intermediate}")
+        self._print(f"第二步: 选择排列{j} ({perm2})")
+        self._print(f"  {intermediate} -> {final_result}")
+        self._print(f"结果匹配目标: {final_result} = {result.target_seq}")
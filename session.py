@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""增量求解：交互输入过程中每得到一项已知条件，就立即收窄各级变换的候选
+
+各级候选由 stage_masks 在当前条件下求出(正向、反向可达状态求交后逐级取支持集)，
+尚未输入的级视为任意变换。可选那一级只剩一个候选时即可给出答案，不必等其余输入完成。
+"""
+
+from typing import List, Optional, Sequence
+
+from perm_engine import Stage, stage_masks
+
+
+class SolveSession:
+    """一道题的增量求解状态"""
+
+    def __init__(self, solver, question_type: str):
+        self.solver = solver
+        self.engine = solver.engine
+        self.question_type = question_type
+        if question_type == '7':
+            # 双管道：两级都从选项中选择
+            self.stages = [Stage.free(), Stage.free()]
+            self.variable_positions = [0, 1]
+        else:
+            fixed_count = 0 if question_type == '1' else 1 if question_type in ['2', '3'] else 2
+            # 固定变换尚未输入，先用恒等变换占位求出各级位置
+            layout, variable_index = solver.question_layout(
+                question_type, [self.engine.perm_strings[self.engine.identity]] * fixed_count, Stage.free())
+            self.stages = [Stage.free() for _ in layout]
+            self.variable_positions = [variable_index]
+        # 固定变换按输入顺序依次填入的位置
+        self.fixed_positions = [i for i in range(len(self.stages)) if i not in self.variable_positions]
+        self._next_fixed = 0
+        self.input_seqs: List[List[str]] = []
+        self.output_seqs: List[List[str]] = []
+        self.masks = [self.engine.full_mask] * len(self.stages)
+
+    def set_sequences(self, input_seqs: List[List[str]], output_seqs: List[List[str]]) -> None:
+        self.input_seqs, self.output_seqs = input_seqs, output_seqs
+        self._update()
+
+    def set_stage(self, index: int, stage: Stage) -> None:
+        self.stages[index] = stage
+        self._update()
+
+    def fix(self, index: int, perm: str) -> None:
+        self.set_stage(index, Stage.fixed(perm))
+
+    def fix_next(self, perm: str) -> int:
+        """按题目顺序填入下一个固定变换，返回其所在的级"""
+        index = self.fixed_positions[self._next_fixed]
+        self._next_fixed += 1
+        self.fix(index, perm)
+        return index
+
+    def restrict(self, index: int, options: Sequence[str]) -> None:
+        self.set_stage(index, Stage.options(options))
+
+    def _update(self) -> None:
+        pairs = self.solver.example_pairs(self.input_seqs, self.output_seqs)
+        if not pairs:
+            self.masks = [self.engine.full_mask] * len(self.stages)
+            return
+        self.masks = stage_masks(pairs[0][0], pairs[0][1], self.stages, examples=pairs[1:])
+
+    @property
+    def has_examples(self) -> bool:
+        return bool(self.solver.example_pairs(self.input_seqs, self.output_seqs))
+
+    @property
+    def solvable(self) -> bool:
+        """当前条件下是否仍然存在解"""
+        return all(self.masks)
+
+    def candidates(self, index: int) -> List[str]:
+        """第index级仍然可行的排列"""
+        return [self.engine.perm_strings[perm_id] for perm_id in self.engine.mask_to_ids(self.masks[index])]
+
+    def option_candidates(self, index: int) -> List[int]:
+        """第index级为选项时，仍然可行的选项编号(从1开始)"""
+        stage = self.stages[index]
+        if stage.kind != Stage.OPTIONS:
+            return []
+        mask = self.masks[index]
+        return [i + 1 for i, perm in enumerate(stage.perms) if mask >> self.engine.index[perm] & 1]
+
+    def decided(self, index: int) -> Optional[str]:
+        """第index级只剩一个候选时返回该排列"""
+        mask = self.masks[index]
+        if not self.has_examples or not mask or mask & (mask - 1):
+            return None
+        return self.engine.perm_strings[mask.bit_length() - 1]
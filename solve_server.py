@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""本地求解服务：常驻进程持有已预热的求解器和排列表，避免每次查询都重新启动解释器
+
+两种接入方式(都只面向本机):
+    Unix套接字  每行一个JSON题目，每行返回一个结果，连接可一直复用；发送 {"op": "stats"} 查看统计
+    HTTP        POST /solve 提交一道题(JSON)，GET /stats 查看统计，默认保持连接(keep-alive)
+同时到达的请求合并为一批求解，统计中给出请求数、批次数和延迟的p50/p99(毫秒)。
+"""
+
+import asyncio
+import http.client
+import json
+import os
+import socket
+import time
+from collections import deque
+from typing import Optional, Tuple
+
+from batch_solver import error_record, solve_record
+from pipe_solver import VisualReasoningSolver
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# 一批最多合并的请求数
+MAX_BATCH = 64
+# 请求体大小上限(字节)
+MAX_BODY = 1 << 20
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            413: 'Payload Too Large'}
+
+
+class LatencyStats:
+    """保留最近history个请求的耗时，计算分位数"""
+
+    def __init__(self, history: int = 10000):
+        self.samples = deque(maxlen=history)
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+
+    def record(self, seconds: float, ok: bool) -> None:
+        self.samples.append(seconds)
+        self.requests += 1
+        if not ok:
+            self.errors += 1
+
+    def percentile(self, fraction: float) -> float:
+        """最近样本的分位数(毫秒)，没有样本时为0"""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(fraction * len(ordered)))
+        return ordered[index] * 1000
+
+    def snapshot(self) -> dict:
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'batches': self.batches,
+            'mean_batch': self.requests / self.batches if self.batches else 0.0,
+            'p50_ms': round(self.percentile(0.50), 3),
+            'p99_ms': round(self.percentile(0.99), 3),
+        }
+
+
+class SolveServer:
+    """持有一个求解器，把并发请求排队后按批求解"""
+
+    def __init__(self, solver: Optional[VisualReasoningSolver] = None, max_batch: int = MAX_BATCH):
+        self.solver = solver if solver is not None else VisualReasoningSolver()
+        self.max_batch = max_batch
+        self.stats = LatencyStats()
+        self._queue: Optional[asyncio.Queue] = None
+        self._batcher: Optional[asyncio.Task] = None
+
+    async def _ensure_batcher(self) -> None:
+        if self._batcher is None:
+            self._queue = asyncio.Queue()
+            self._batcher = asyncio.ensure_future(self._run_batches())
+
+    async def _run_batches(self) -> None:
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            # 让出一次事件循环，收集同一时刻到达的其他请求
+            await asyncio.sleep(0)
+            while len(batch) < self.max_batch and not queue.empty():
+                batch.append(queue.get_nowait())
+            self.stats.batches += 1
+            for puzzle, index, future, started in batch:
+                try:
+                    result = solve_record(self.solver, puzzle, index)
+                except Exception as e:
+                    # 兜底：任何一道题出错都只影响它自己，批处理循环不能退出
+                    result = error_record(puzzle, index, e)
+                self.stats.record(time.perf_counter() - started, result['status'] != 'error')
+                if not future.cancelled():
+                    future.set_result(result)
+
+    async def submit(self, puzzle, index: int = 1) -> dict:
+        """提交一道已解析的题目，等待所在批次求解完成"""
+        await self._ensure_batcher()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((puzzle, index, future, time.perf_counter()))
+        return await future
+
+    async def dispatch(self, text: str, index: int = 1) -> dict:
+        """解析一条请求(JSON文本)：带op字段的是控制请求，其余作为题目提交"""
+        started = time.perf_counter()
+        try:
+            request = json.loads(text)
+        except Exception as e:
+            self.stats.record(time.perf_counter() - started, False)
+            return error_record(None, index, e)
+        if isinstance(request, dict) and 'op' in request:
+            if request['op'] == 'stats':
+                return self.stats.snapshot()
+            self.stats.record(time.perf_counter() - started, False)
+            return error_record(request, index, ValueError(f"未知操作: {request['op']}"))
+        return await self.submit(request, index)
+
+    async def handle_lines(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Unix套接字：逐行读取请求、逐行返回结果"""
+        index = 0
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                text = line.decode('utf-8').strip()
+                if not text:
+                    continue
+                index += 1
+                response = await self.dispatch(text, index)
+                writer.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            # 连接断开、行超长或不是UTF-8时关闭连接
+            pass
+        finally:
+            writer.close()
+
+    async def handle_http(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """HTTP/1.1：POST /solve、GET /stats，默认保持连接"""
+        index = 0
+        try:
+            while True:
+                try:
+                    request = await _read_http_request(reader)
+                except _BadRequest as e:
+                    writer.write(_http_response(400, {'error': str(e)}, False))
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                index += 1
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                if body is None:
+                    status, payload = 413, {'error': '请求体过大'}
+                    keep_alive = False
+                elif path == '/stats':
+                    status, payload = (200, self.stats.snapshot()) if method == 'GET' else (405, {'error': method})
+                elif path == '/solve':
+                    if method == 'POST':
+                        status, payload = 200, await self.dispatch(body.decode('utf-8', 'replace'), index)
+                    else:
+                        status, payload = 405, {'error': method}
+                else:
+                    status, payload = 404, {'error': path}
+                writer.write(_http_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, socket_path: Optional[str] = None, host: str = DEFAULT_HOST,
+                    port: int = DEFAULT_PORT):
+        """启动监听，给出socket_path时使用Unix套接字，否则在host:port上提供HTTP"""
+        await self._ensure_batcher()
+        if socket_path is not None:
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+            return await asyncio.start_unix_server(self.handle_lines, path=socket_path)
+        return await asyncio.start_server(self.handle_http, host=host, port=port)
+
+
+class _BadRequest(ValueError):
+    """无法解析的HTTP请求，回复400后关闭连接"""
+
+
+async def _read_http_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, dict, Optional[bytes]]]:
+    """读取一个HTTP请求；连接关闭时返回None，请求体超过上限时body为None"""
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+    parts = request_line.decode('latin-1').split()
+    if len(parts) != 3:
+        raise _BadRequest("无效的请求行")
+    method, path, _ = parts
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if not line or line in (b'\r\n', b'\n'):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = headers.get('content-length', '0')
+    if not (length.isascii() and length.isdigit()):
+        raise _BadRequest(f"无效的Content-Length: {length}")
+    length = int(length)
+    if length > MAX_BODY:
+        return method, path, headers, None
+    body = await reader.readexactly(length) if length else b''
+    return method, path.split('?', 1)[0], headers, body
+
+
+def _http_response(status: int, payload, keep_alive: bool) -> bytes:
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    head = (f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode('latin-1') + body
+
+
+def run_server(socket_path: Optional[str] = None, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+               num_symbols: int = 4, solve_mode: str = 'algebraic') -> None:
+    """启动服务并一直运行(Ctrl+C退出)"""
+    solver = VisualReasoningSolver(solve_mode=solve_mode, num_symbols=num_symbols)
+
+    async def serve():
+        server = await SolveServer(solver).start(socket_path, host, port)
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if socket_path is not None and os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+class SolveClient:
+    """本地服务的同步客户端，连接在多次请求之间复用"""
+
+    def __init__(self, socket_path: Optional[str] = None, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                 timeout: float = 10.0):
+        self.socket_path = socket_path
+        if socket_path is not None:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.settimeout(timeout)
+            self._socket.connect(socket_path)
+            self._stream = self._socket.makefile('rwb')
+        else:
+            self._http = http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def _line_request(self, payload: dict) -> dict:
+        self._stream.write(json.dumps(payload, ensure_ascii=False).encode('utf-8') + b'\n')
+        self._stream.flush()
+        line = self._stream.readline()
+        if not line:
+            raise ConnectionError("服务已断开连接")
+        return json.loads(line)
+
+    def _http_request(self, method: str, path: str, payload: Optional[dict] = None) -> dict:
+        body = None if payload is None else json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        self._http.request(method, path, body=body, headers=headers)
+        response = self._http.getresponse()
+        return json.loads(response.read())
+
+    def solve(self, puzzle: dict) -> dict:
+        """求解一道题，格式与批量模式相同"""
+        if self.socket_path is not None:
+            return self._line_request(puzzle)
+        return self._http_request('POST', '/solve', puzzle)
+
+    def stats(self) -> dict:
+        """服务端的请求数、批次数和延迟分位数"""
+        if self.socket_path is not None:
+            return self._line_request({'op': 'stats'})
+        return self._http_request('GET', '/stats')
+
+    def close(self) -> None:
+        if self.socket_path is not None:
+            self._stream.close()
+            self._socket.close()
+        else:
+            self._http.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
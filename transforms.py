@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""变换代数：管道的每一级都是序列状态上的函数，用整个状态空间上的查表向量表示
+
+状态与 PermutationEngine 相同：长度n、形状取值0..n-1的序列按n进制编码为整数，
+每种变换都归结为同一种表示 table[code]，位置排列只是其中一类(直接共用引擎的作用表)：
+    2314        位置排列，语义与 apply_permutation 相同
+    rot:1       循环左移k位(排列的特例)，rot:-1 为右移
+    sub:2134    逐个替换形状: 第i位数字为形状i变成的形状(可以不是一一映射)
+    put:0300    把某些位置改为指定形状，0表示该位置不变
+    a>b         先a后b的复合
+复合就是向量下标(先a后b: b[a[x]])。多级搜索从输入正向、从目标反向(取原像)各展开一半，
+在中间层求交后按字典序枚举，与 perm_engine 的排列管道相同。
+"""
+
+import itertools
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from perm_engine import LazyRow, PermutationEngine, PipelineSolution, get_engine, walk_paths
+
+PERM = 'perm'
+ROTATE = 'rotate'
+SUBSTITUTE = 'substitute'
+REPLACE = 'replace'
+COMPOSE = 'compose'
+_PREFIXES = {'rot': ROTATE, 'sub': SUBSTITUTE, 'put': REPLACE}
+
+
+class Transform:
+    """一级变换：table[code] 为序列code经过该变换后的编码
+
+    perm_id 不为None时该变换是位置排列，table即引擎的作用表、逆变换查表即得原像；
+    其余变换的原像按各自的结构由数字直接构造，结果按状态缓存。
+    """
+
+    __slots__ = ('algebra', 'kind', 'spec', 'table', 'perm_id', '_preimage', '_preimages')
+
+    def __init__(self, algebra: 'TransformAlgebra', kind: str, spec: str, table,
+                 perm_id: Optional[int] = None, preimage=None):
+        self.algebra = algebra
+        self.kind = kind
+        self.spec = spec
+        self.table = table
+        self.perm_id = perm_id
+        self._preimage = preimage
+        self._preimages: Dict[int, Tuple[int, ...]] = {}
+
+    def __call__(self, code: int) -> int:
+        return self.table[code]
+
+    def preimage(self, code: int) -> Tuple[int, ...]:
+        """经过该变换后得到code的全部状态(升序)"""
+        if self.perm_id is not None:
+            engine = self.algebra.engine
+            return (engine.action[engine.inverse[self.perm_id]][code],)
+        result = self._preimages.get(code)
+        if result is None:
+            result = self._preimages[code] = tuple(sorted(self._preimage(code)))
+        return result
+
+    def __repr__(self):
+        return f"Transform({self.spec!r})"
+
+
+class TransformAlgebra:
+    """n位序列上的全部变换：解析、构造与复合"""
+
+    def __init__(self, n: int = 4):
+        self.engine: PermutationEngine = get_engine(n)
+        self.n = n
+        self.size = self.engine.size
+        # 排列变换直接共用引擎的作用表(不计数的原始行)，每个排列只构造一次
+        self.perms = [Transform(self, PERM, perm, row, perm_id)
+                      for perm_id, (perm, row) in enumerate(zip(self.engine.perm_strings, self.engine.plain_action))]
+        self.identity = self.perms[self.engine.identity]
+        self._parsed: Dict[str, Transform] = {}
+
+    def _table(self, fill) -> Union[List[int], LazyRow]:
+        """按状态计算的查表向量：引擎预计算完整表格时一次算好，否则按需填充"""
+        if self.engine.eager:
+            return [fill(code) for code in range(self.size)]
+        return LazyRow(fill)
+
+    def permutation(self, perm: str) -> Transform:
+        perm_id = self.engine.perm_id(perm)
+        if perm_id is None:
+            raise ValueError(f"不是合法的{self.n}位排列: {perm}")
+        return self.perms[perm_id]
+
+    def rotation(self, k: int) -> Transform:
+        """循环左移k位: 新位置i的元素来自原位置 i+k"""
+        perm = ''.join(str((i + k) % self.n + 1) for i in range(self.n))
+        perm_id = self.engine.perm_id(perm)
+        return Transform(self, ROTATE, f'rot:{k}', self.engine.plain_action[perm_id], perm_id)
+
+    def substitution(self, mapping: str) -> Transform:
+        """逐个替换形状: mapping第i位为形状i变成的形状"""
+        targets = self._shapes(mapping, 'sub', allow_zero=False)
+        engine = self.engine
+        sources: Dict[int, List[int]] = {}
+        for shape, target in enumerate(targets):
+            sources.setdefault(target, []).append(shape)
+
+        def fill(code: int) -> int:
+            return engine.encode([targets[s] for s in engine.decode(code)])
+
+        def preimage(code: int):
+            choices = [sources.get(s, ()) for s in engine.decode(code)]
+            return (engine.encode(symbols) for symbols in itertools.product(*choices))
+
+        return Transform(self, SUBSTITUTE, f'sub:{mapping}', self._table(fill), preimage=preimage)
+
+    def replacement(self, mask: str) -> Transform:
+        """把mask中非0的位置改为对应形状，0的位置不变"""
+        values = self._shapes(mask, 'put', allow_zero=True)
+        engine = self.engine
+        every = range(self.n)
+
+        def fill(code: int) -> int:
+            return engine.encode([s if v < 0 else v for s, v in zip(engine.decode(code), values)])
+
+        def preimage(code: int):
+            symbols = engine.decode(code)
+            if any(v >= 0 and s != v for s, v in zip(symbols, values)):
+                return ()
+            choices = [(s,) if v < 0 else every for s, v in zip(symbols, values)]
+            return (engine.encode(option) for option in itertools.product(*choices))
+
+        return Transform(self, REPLACE, f'put:{mask}', self._table(fill), preimage=preimage)
+
+    def _shapes(self, digits: str, prefix: str, allow_zero: bool) -> List[int]:
+        """把 sub/put 的参数转为形状编号列表(0..n-1，put中不变的位置为-1)"""
+        low = 0 if allow_zero else 1
+        if len(digits) != self.n or any(not c.isdigit() or not low <= int(c) <= self.n for c in digits):
+            raise ValueError(f"{prefix}需要{self.n}位取值{low}-{self.n}的数字: {digits}")
+        return [int(c) - 1 for c in digits]
+
+    def compose(self, first: Transform, second: Transform) -> Transform:
+        """先first后second；两者都是排列时结果仍是排列"""
+        spec = f'{first.spec}>{second.spec}'
+        if first.perm_id is not None and second.perm_id is not None:
+            perm_id = self.engine.compose[first.perm_id][second.perm_id]
+            return Transform(self, PERM, spec, self.engine.plain_action[perm_id], perm_id)
+        if isinstance(first.table, list) and isinstance(second.table, list):
+            # 向量下标: b[a[x]]
+            table = list(map(second.table.__getitem__, first.table))
+        else:
+            table = LazyRow(lambda code: second.table[first.table[code]])
+
+        def preimage(code: int):
+            return {x for y in second.preimage(code) for x in first.preimage(y)}
+
+        return Transform(self, COMPOSE, spec, table, preimage=preimage)
+
+    def parse(self, spec: str) -> Transform:
+        """按模块说明中的写法解析一级变换，同一写法只构造一次"""
+        transform = self._parsed.get(spec)
+        if transform is None:
+            if '>' in spec:
+                parts = [self.parse(part) for part in spec.split('>')]
+                transform = parts[0]
+                for part in parts[1:]:
+                    transform = self.compose(transform, part)
+            else:
+                prefix, _, argument = spec.partition(':')
+                kind = _PREFIXES.get(prefix) if argument else None
+                if kind is None:
+                    transform = self.permutation(spec)
+                elif kind == ROTATE:
+                    try:
+                        transform = self.rotation(int(argument))
+                    except ValueError:
+                        raise ValueError(f"rot需要整数位移: {spec}") from None
+                elif kind == SUBSTITUTE:
+                    transform = self.substitution(argument)
+                else:
+                    transform = self.replacement(argument)
+            self._parsed[spec] = transform
+        return transform
+
+    def encode(self, sequence: Sequence) -> int:
+        """把形状数字序列(如 "1123")编码为状态"""
+        if len(sequence) != self.n or any(not 1 <= int(s) <= self.n for s in sequence):
+            raise ValueError(f"序列需要{self.n}位取值1-{self.n}的形状数字: {''.join(map(str, sequence))}")
+        return self.engine.encode([int(s) - 1 for s in sequence])
+
+    def decode(self, code: int) -> str:
+        return ''.join(str(s + 1) for s in self.engine.decode(code))
+
+
+@lru_cache(maxsize=None)
+def get_algebra(n: int = 4) -> TransformAlgebra:
+    """获取n位变换代数(每个进程只构建一次)"""
+    return TransformAlgebra(n)
+
+
+def is_transform_spec(spec) -> bool:
+    """一级的写法中是否用到了排列以外的变换"""
+    if isinstance(spec, str):
+        return ':' in spec or '>' in spec
+    if isinstance(spec, (list, tuple)):
+        return any(is_transform_spec(item) for item in spec)
+    return False
+
+
+TransformSpec = Union[str, Sequence[str], None]
+
+
+def _stage_transforms(algebra: TransformAlgebra, spec: TransformSpec) -> List[Transform]:
+    """一级的候选变换：字符串为固定变换，None为任意排列，列表为选项"""
+    if spec is None:
+        return algebra.perms
+    if isinstance(spec, str):
+        return [algebra.parse(spec)]
+    return [algebra.parse(str(item)) for item in spec]
+
+
+def _step(transform: Transform, state: Tuple[int, ...]) -> Tuple[int, ...]:
+    table = transform.table
+    return tuple(table[x] for x in state)
+
+
+def _preimages(transform: Transform, state: Tuple[int, ...]) -> Iterator[Tuple[int, ...]]:
+    """所有样例同时取原像(同一个变换)"""
+    return itertools.product(*(transform.preimage(y) for y in state))
+
+
+def _iter_paths(src: Tuple[int, ...], dst: Tuple[int, ...],
+                plan: List[List[Transform]]) -> Iterator[Tuple[int, ...]]:
+    """双向搜索：正向展开前一半，反向取原像展开后一半，在中间层求交后按字典序枚举各级选择"""
+    k = len(plan)
+    mid = (k + 1) // 2
+    forward = {src}
+    for stage in range(mid):
+        forward = {_step(t, state) for t in plan[stage] for state in forward}
+    # goals[i]: 第i层中能到达目标的状态
+    goals: List[Optional[set]] = [None] * (k + 1)
+    goals[k] = {dst}
+    for stage in range(k - 1, mid - 1, -1):
+        goals[stage] = {x for t in plan[stage] for y in goals[stage + 1] for x in _preimages(t, y)}
+    goals[mid] = goals[mid] & forward
+    if not goals[mid]:
+        return
+
+    def children(stage: int, state):
+        for choice, transform in enumerate(plan[stage]):
+            yield choice, _step(transform, state)
+
+    yield from walk_paths(src, k, mid, goals, children)
+
+
+def _iter_brute_force(src: Tuple[int, ...], dst: Tuple[int, ...],
+                      plan: List[List[Transform]]) -> Iterator[Tuple[int, ...]]:
+    """对照实现：逐个枚举所有组合"""
+    for choices in itertools.product(*(range(len(transforms)) for transforms in plan)):
+        state = src
+        for transforms, choice in zip(plan, choices):
+            state = _step(transforms[choice], state)
+        if state == dst:
+            yield choices
+
+
+def _fold(algebra: TransformAlgebra, plan: List[List[Transform]]) -> Tuple[List[List[Transform]], List[int]]:
+    """相邻的固定变换预先复合为一级，返回 (折叠后的各级, 每级对应的原始级数)"""
+    folded: List[List[Transform]] = []
+    widths: List[int] = []
+    for transforms in plan:
+        if len(transforms) == 1 and folded and len(folded[-1]) == 1 and widths[-1] > 0:
+            folded[-1] = [algebra.compose(folded[-1][0], transforms[0])]
+            widths[-1] += 1
+        else:
+            folded.append(transforms)
+            # 选项只有一个时也可以和后面的固定变换合并，任意变换和多选项不合并
+            widths.append(1 if len(transforms) == 1 else -1)
+    return folded, [abs(width) for width in widths]
+
+
+def iter_transform_solutions(input_seq: Sequence, output_seq: Sequence, stages: Sequence[TransformSpec],
+                             brute_force: bool = False,
+                             examples: Sequence[Tuple[Sequence, Sequence]] = ()) -> Iterator[PipelineSolution]:
+    """按字典序逐个给出含一般变换的管道的可行解
+
+    序列为形状数字(如 "1123")，长度即位数；stages 每一级为变换写法(见模块说明)、
+    None(任意排列)或写法列表(选项)。解的perms为每级选中变换的写法。
+    """
+    algebra = get_algebra(len(input_seq))
+    plan = [_stage_transforms(algebra, spec) for spec in stages]
+    pairs = [(input_seq, output_seq)] + list(examples)
+    src = tuple(algebra.encode(example_input) for example_input, _ in pairs)
+    dst = tuple(algebra.encode(example_output) for _, example_output in pairs)
+
+    if brute_force:
+        search = _iter_brute_force(src, dst, plan)
+    else:
+        folded, widths = _fold(algebra, plan)
+        # 折叠后的固定级在原始各级中都选第0个
+        search = (tuple(itertools.chain.from_iterable(
+            [choice] if width == 1 else [0] * width for choice, width in zip(choices, widths)))
+            for choices in _iter_paths(src, dst, folded))
+    for choices in search:
+        yield PipelineSolution(choices, tuple(transforms[choice].spec for transforms, choice in zip(plan, choices)))
+
+
+def solve_transforms(input_seq: Sequence, output_seq: Sequence, stages: Sequence[TransformSpec],
+                     limit: Optional[int] = None, brute_force: bool = False,
+                     examples: Sequence[Tuple[Sequence, Sequence]] = ()) -> List[PipelineSolution]:
+    """求解含一般变换的管道，返回至多limit组解(按字典序)"""
+    return list(itertools.islice(iter_transform_solutions(input_seq, output_seq, stages, brute_force=brute_force,
+                                                          examples=examples), limit))
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""NumPy向量化后端：一次性求出整组候选管道的结果
+
+序列编码为 uint8 数组，全部排列组成 (n!, n) 的下标矩阵，
+每一级变换对所有候选同时做一次花式索引，最后用一次数组比较得出全部可行组合。
+候选网格不大时比逐级搜索更快；未安装NumPy时 HAVE_NUMPY 为False，求解器照常使用纯Python实现。
+"""
+
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+
+from perm_engine import PipelineSolution, StageSpec, get_engine, prepare_pipeline
+
+try:
+    import numpy as np
+    HAVE_NUMPY = True
+except ImportError:  # pragma: no cover - 取决于运行环境
+    np = None
+    HAVE_NUMPY = False
+
+# 单次比较的候选格子数上限(样例数 × 各级候选数之积)，超过时由调用方改用其他方法
+GRID_MAX_CELLS = 1 << 21
+
+
+class VectorEngine:
+    """n位排列的向量化引擎，排列编号与 PermutationEngine 一致"""
+
+    def __init__(self, n: int = 4):
+        if not HAVE_NUMPY:
+            raise ImportError("向量化后端需要安装NumPy")
+        self.engine = get_engine(n)
+        self.n = n
+        # matrix[p]: 排列p的下标向量，seq[matrix[p]] 即变换结果
+        self.matrix = np.array(self.engine.perms, dtype=np.intp).reshape(len(self.engine.perms), n)
+        self.all_ids = np.arange(len(self.engine.perms))
+
+    def encode(self, codes: Sequence[int]) -> 'np.ndarray':
+        """把整数编码的序列批量还原为 (m, n) 的 uint8 数组"""
+        return np.array([self.engine.decode(code) for code in codes], dtype=np.uint8).reshape(len(codes), self.n)
+
+    def _stage_matrix(self, ids: Optional[List[int]]) -> 'np.ndarray':
+        return self.matrix[self.all_ids if ids is None else np.asarray(ids, dtype=np.intp)]
+
+    def grid_cells(self, plan: List[Optional[List[int]]], examples: int = 1) -> int:
+        """完整候选网格的格子数"""
+        cells = examples
+        for ids in plan:
+            cells *= len(self.engine.perms) if ids is None else len(ids)
+        return cells
+
+    def grid(self, inputs: 'np.ndarray', outputs: 'np.ndarray', plan: List[Optional[List[int]]]) -> 'np.ndarray':
+        """对m组 (输入, 输出) 求出全部候选组合是否可行，返回形如 (m, 第1级候选数, ...) 的布尔数组"""
+        states = inputs
+        for ids in plan:
+            # (..., n) 按每个候选排列取下标 -> (..., 候选数, n)
+            states = np.take(states, self._stage_matrix(ids), axis=-1)
+        target = outputs.reshape(outputs.shape[:1] + (1,) * len(plan) + outputs.shape[1:])
+        return (states == target).all(axis=-1)
+
+    def iter_solutions(self, inputs: 'np.ndarray', outputs: 'np.ndarray',
+                       plan: List[Optional[List[int]]]) -> List[Tuple[int, ...]]:
+        """同时满足全部样例的选择(按字典序)"""
+        feasible = self.grid(inputs, outputs, plan).all(axis=0)
+        return [tuple(int(choice) for choice in row) for row in np.argwhere(feasible)]
+
+
+@lru_cache(maxsize=None)
+def get_vector_engine(n: int = 4) -> VectorEngine:
+    """获取n位向量化引擎(每个进程只构建一次)"""
+    return VectorEngine(n)
+
+
+def solve_pipeline(input_seq: Sequence, output_seq: Sequence, stages: Sequence[StageSpec],
+                   limit: Optional[int] = None,
+                   examples: Sequence[Tuple[Sequence, Sequence]] = ()) -> Optional[List[PipelineSolution]]:
+    """与 perm_engine.solve_pipeline 相同，候选网格超过 GRID_MAX_CELLS 时返回None"""
+    pipeline, space = prepare_pipeline(input_seq, output_seq, stages, examples)
+    if space is None:
+        return []
+    stages, plan = pipeline.stages, pipeline.plan
+    vector = get_vector_engine(space.engine.n)
+    sources = space.src if space.multi else (space.src,)
+    targets = space.dst if space.multi else (space.dst,)
+    if vector.grid_cells(plan, len(sources)) > GRID_MAX_CELLS:
+        return None
+    choices_list = vector.iter_solutions(vector.encode(sources), vector.encode(targets), plan)
+    perm_strings = space.engine.perm_strings
+    return [PipelineSolution(choices, tuple(perm_strings[choice] if ids is None else stage.perms[choice]
+                                            for stage, ids, choice in zip(stages, plan, choices)))
+            for choices in choices_list[:limit]]